@@ -0,0 +1,574 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+
+def make_large_jpegs(directory, count=5, size=(6400, 4800), quality=95):
+    """
+    生成用于测试的大尺寸 JPEG（随机噪声，默认约 20–40MB），不带 EXIF。
+
+    :param directory: 输出目录
+    :param count: 生成的文件数量
+    :param size: 图像尺寸
+    :param quality: JPEG 质量
+    :return: 生成的文件路径列表
+    """
+    import numpy as np
+    from PIL import Image
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"large_{i:03d}.jpg")
+        if not os.path.exists(path):
+            pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(path, "jpeg", quality=quality)
+        paths.append(path)
+    return paths
+
+
+def bench_add_shooting_time(corpus_dir):
+    """
+    比较 add_shooting_time 无损写入与重新编码两种方式的吞吐量。
+
+    :param corpus_dir: 包含 JPEG 文件的目录，文件会被复制后再处理，原文件不变
+    :return: 字典，键为模式名，值为 (文件数, 秒, MB/s)
+    """
+    import photo_date
+
+    sources = sorted(os.path.join(corpus_dir, f) for f in os.listdir(corpus_dir)
+                     if f.lower().endswith(('.jpg', '.jpeg')))
+    total_mb = sum(os.path.getsize(p) for p in sources) / 1024 / 1024
+    results = {}
+    for mode, lossless in (('reencode', False), ('lossless', True)):
+        with tempfile.TemporaryDirectory() as work_dir:
+            copies = []
+            for src in sources:
+                dst = os.path.join(work_dir, os.path.basename(src))
+                shutil.copyfile(src, dst)
+                copies.append(dst)
+            start = time.perf_counter()
+            for path in copies:
+                photo_date.add_shooting_time(path, "20200101_120000", lossless=lossless)
+            elapsed = time.perf_counter() - start
+        results[mode] = (len(sources), elapsed, total_mb / elapsed if elapsed else 0.0)
+        print(f"[add_shooting_time/{mode}] {len(sources)} files, {total_mb:.1f} MB, "
+              f"{elapsed:.2f}s, {results[mode][2]:.1f} MB/s")
+    return results
+
+
+def bench_parse_date(count=100000):
+    """
+    比较表驱动的文件名解析与旧实现的速度，并校验两者结果一致。
+
+    :param count: 文件名数量
+    :return: 字典，包含 legacy、single、batch 的耗时（秒）以及 mismatches
+    """
+    import photo_date
+    from tests.parse_date_cases import legacy, make_file_names
+
+    names = make_file_names(count)
+
+    results = {}
+    start = time.perf_counter()
+    expected = [legacy(name) for name in names]
+    results['legacy'] = time.perf_counter() - start
+
+    photo_date.reset_current_time()
+    start = time.perf_counter()
+    single = [photo_date.parse_file_name_date(name) for name in names]
+    results['single'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = photo_date.parse_file_name_dates(names)
+    results['batch'] = time.perf_counter() - start
+
+    mismatches = [(name, e, a, b) for name, e, a, b in zip(names, expected, single, batch) if not e == a == b]
+    results['mismatches'] = len(mismatches)
+    for name, e, a, b in mismatches[:10]:
+        print(f"Mismatch: {name!r}: legacy={e} single={a} batch={b}")
+    parsed = sum(1 for e in expected if e)
+    print(f"[parse_date] {count} names ({parsed} with dates): legacy {results['legacy']:.2f}s, "
+          f"single {results['single']:.2f}s, batch {results['batch']:.2f}s, "
+          f"speedup {results['legacy'] / results['batch']:.1f}x, {len(mismatches)} mismatches")
+    return results
+
+
+def make_tree(directory, dirs=200, files_per_dir=20, depth=3):
+    """
+    生成用于遍历测试的目录树，文件为空文件。
+
+    :param directory: 输出目录
+    :param dirs: 目录数量
+    :param files_per_dir: 每个目录中的文件数
+    :param depth: 目录最大深度
+    """
+    for i in range(dirs):
+        parts = [f"d{(i // 10 ** level) % 10}" for level in range(depth)]
+        path = os.path.join(directory, *parts, f"leaf{i}")
+        os.makedirs(path, exist_ok=True)
+        for j in range(files_per_dir):
+            open(os.path.join(path, f"IMG_{i:04d}_{j:03d}.jpg"), 'wb').close()
+
+
+class _SlowEntry:
+    """包装 os.DirEntry，第一次 stat 时模拟网络往返"""
+
+    def __init__(self, entry, latency):
+        self._entry = entry
+        self._latency = latency
+        self._stat = None
+        self.name = entry.name
+        self.path = entry.path
+
+    def __fspath__(self):
+        return self.path
+
+    def is_dir(self, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def inode(self):
+        return self._entry.inode()
+
+    def stat(self, follow_symlinks=True):
+        if self._stat is None:
+            time.sleep(self._latency)
+            self._stat = self._entry.stat(follow_symlinks=follow_symlinks)
+        return self._stat
+
+
+class simulated_latency:
+    """在 with 块中给 os.scandir 和 os.stat 加上固定延迟，模拟高延迟的网络挂载"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __enter__(self):
+        real_scandir, real_stat, latency = os.scandir, os.stat, self.latency
+
+        class SlowScandir:
+            def __init__(self, path='.'):
+                time.sleep(latency)
+                self._iterator = real_scandir(path)
+
+            def __iter__(self):
+                return self
+
+            def __next__(self):
+                return _SlowEntry(next(self._iterator), latency)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                self.close()
+
+            def close(self):
+                self._iterator.close()
+
+        def slow_stat(path, *args, **kwargs):
+            time.sleep(latency)
+            return real_stat(path, *args, **kwargs)
+
+        self._saved = real_scandir, real_stat
+        os.scandir, os.stat = SlowScandir, slow_stat
+        return self
+
+    def __exit__(self, *args):
+        os.scandir, os.stat = self._saved
+
+
+def bench_scan(latency=0.002, dirs=200, files_per_dir=20):
+    """
+    比较 os.walk + getsize 与 scanner.scan 在高延迟挂载上的耗时。
+
+    :param latency: 每次列目录和 stat 的模拟延迟（秒）
+    :param dirs: 目录数量
+    :param files_per_dir: 每个目录中的文件数
+    :return: 字典，键为方式名，值为秒
+    """
+    import scanner
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, dirs, files_per_dir)
+        with simulated_latency(latency):
+            start = time.perf_counter()
+            total = 0
+            for directory, _, files in os.walk(root):
+                for file in files:
+                    total += os.path.getsize(os.path.join(directory, file))
+            results['os.walk'] = time.perf_counter() - start
+            for workers in (1, scanner.SCAN_WORKERS, scanner.SCAN_WORKERS * 4):
+                start = time.perf_counter()
+                total = 0
+                for entry in scanner.scan(root, workers=workers, prefetch_stat=True):
+                    total += entry.stat().st_size
+                results[f'scan/{workers}'] = time.perf_counter() - start
+    print(f"[scan] {dirs} dirs x {files_per_dir} files, {latency * 1000:.1f} ms latency: " +
+          ", ".join(f"{name} {seconds:.2f}s" for name, seconds in results.items()))
+    return results
+
+
+# 合成语料的版本号，生成逻辑变化时加一，旧的缓存语料会被重新生成
+CORPUS_VERSION = 1
+# 剧集目录中的文件名形状（season_rename.parse_file_name 能识别的几种以及无法识别的）
+EPISODE_SHAPES = [
+    lambda n: f"安全警长啦咘啦哆.An.Quan.Jing.Zhang.S01E{n:02d}.2022.2160p.WEB-DL.AAC.H265-HDSWEB",
+    lambda n: f"Gourd.Brothers.1986.E{n:02d}.Webrip.1080p.x265.10bit.AAC.MNHD-FRDS",
+    lambda n: f"超级飞侠 第{n:02d}集 迷路的小羚羊-超高清 4K",
+    lambda n: f"{n} 蒙古国恐龙之旅（上）4K",
+    lambda n: f"Extras.Behind.The.Scenes.{n:02d}",
+]
+
+
+def _write_noise_jpeg(path, rng, size, exif_time=None):
+    import numpy as np
+    import piexif
+    from PIL import Image
+
+    # 低频噪声：压缩后的大小接近真实照片，而不是纯噪声那样过大
+    small = rng.integers(0, 256, (size[1] // 16, size[0] // 16, 3), dtype=np.uint8)
+    img = Image.fromarray(small).resize(size, Image.BILINEAR)
+    if exif_time is None:
+        img.save(path, "jpeg", quality=90)
+    else:
+        exif = piexif.dump({"0th": {}, "Exif": {piexif.ExifIFD.DateTimeOriginal: exif_time.encode()},
+                            "GPS": {}, "Interop": {}, "1st": {}, "thumbnail": None})
+        img.save(path, "jpeg", quality=90, exif=exif)
+
+
+def _write_rgba_png(path, rng, size, creation_time):
+    import numpy as np
+    from PIL import Image, PngImagePlugin
+
+    pixels = rng.integers(0, 256, (size[1] // 16, size[0] // 16, 4), dtype=np.uint8)
+    img = Image.fromarray(pixels, 'RGBA').resize(size, Image.NEAREST)
+    info = PngImagePlugin.PngInfo()
+    info.add_text('Creation Time', creation_time)
+    img.save(path, "png", pnginfo=info)
+
+
+def _write_test_clip(path, index, seconds=2):
+    """用 ffmpeg 的 lavfi 测试源生成短视频（固定参数，bitexact 输出）"""
+    import subprocess
+
+    sources = ('testsrc2', 'smptebars', 'rgbtestsrc', 'testsrc')
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f"{sources[index % len(sources)]}=size=320x240:rate=25:duration={seconds}",
+        '-f', 'lavfi', '-i', f"sine=frequency={220 + 110 * index}:duration={seconds}",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '25', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest', '-map_metadata', '-1',
+        '-fflags', '+bitexact', '-flags:v', '+bitexact', '-flags:a', '+bitexact',
+        path
+    ], check=True)
+
+
+def make_media_corpus(directory, photos=200, videos=8, episodes=12, duplicates=0.1, seed=0):
+    """
+    生成可重复的合成媒体语料，内容只与参数有关。参数相同且语料已经存在时直接复用。
+
+    目录结构：
+        photos/   无 EXIF 的 JPEG（文件名带日期）、带 EXIF 的 JPEG、带 tEXt Creation Time 的 RGBA PNG、
+                  无法识别日期的文件名，以及按 duplicates 比例复制出的重复文件
+        videos/   lavfi 测试源生成的 MP4/MKV 短视频（需要 ffmpeg，没有时跳过）
+        library/  剧集目录 <剧名>/S01，包含各种 parse_file_name 能识别的文件名、.nfo 和字幕
+
+    :param directory: 输出目录
+    :param photos: 图片数量（不含重复文件）
+    :param videos: 视频数量（不含重复文件）
+    :param episodes: 每种文件名形状的剧集数量
+    :param duplicates: 复制为重复文件的比例
+    :param seed: 随机种子
+    :return: 语料参数字典（同时写入 directory/manifest.json）
+    """
+    import json
+    import random
+    from datetime import datetime, timedelta
+
+    import numpy as np
+
+    params = {'version': CORPUS_VERSION, 'photos': photos, 'videos': videos, 'episodes': episodes,
+              'duplicates': duplicates, 'seed': seed}
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            if json.load(f) == params:
+                return params
+    if os.path.exists(directory):
+        # 参数不同或上次生成到一半
+        shutil.rmtree(directory)
+
+    rng = np.random.default_rng(seed)
+    names = random.Random(seed)
+    start = datetime(2015, 1, 1)
+
+    def moment():
+        return start + timedelta(seconds=names.randrange(0, 8 * 365 * 24 * 3600))
+
+    photo_dir = os.path.join(directory, 'photos')
+    os.makedirs(photo_dir)
+    photo_paths = []
+    for i in range(photos):
+        t = moment()
+        size = (names.choice((1600, 2400, 3200)), names.choice((1200, 1800)))
+        kind = i % 5
+        if kind == 0:
+            path = os.path.join(photo_dir, f"IMG_{t:%Y%m%d_%H%M%S}_{i}.jpg")
+            _write_noise_jpeg(path, rng, size, exif_time=f"{t:%Y:%m:%d %H:%M:%S}")
+        elif kind == 1:
+            path = os.path.join(photo_dir, f"Screenshot_{t:%Y-%m-%d-%H-%M-%S}-{i:03d}.png")
+            _write_rgba_png(path, rng, (size[0] // 2, size[1] // 2), f"{t:%Y:%m:%d %H:%M:%S}")
+        elif kind == 2:
+            path = os.path.join(photo_dir, f"mmexport{int(t.timestamp() * 1000)}.jpg")
+            _write_noise_jpeg(path, rng, size)
+        elif kind == 3:
+            path = os.path.join(photo_dir, f"MYXJ_{t:%Y%m%d%H%M%S}_{i}_fast.jpg")
+            _write_noise_jpeg(path, rng, size)
+        else:
+            path = os.path.join(photo_dir, f"DSC{i:05d}.JPG")
+            _write_noise_jpeg(path, rng, size)
+        photo_paths.append(path)
+
+    video_paths = []
+    if videos and shutil.which('ffmpeg'):
+        video_dir = os.path.join(directory, 'videos')
+        os.makedirs(video_dir)
+        for i in range(videos):
+            t = moment()
+            ext = '.mkv' if i % 4 == 3 else '.mp4'
+            path = os.path.join(video_dir, f"VID_{t:%Y%m%d_%H%M%S}{ext}")
+            _write_test_clip(path, i)
+            video_paths.append(path)
+    elif videos:
+        print("ffmpeg not found, corpus has no videos")
+
+    # 重复文件放在单独的子目录中，文件名不同、内容相同
+    duplicate_dir = os.path.join(directory, 'photos', 'backup')
+    os.makedirs(duplicate_dir)
+    sources = photo_paths + video_paths
+    for path in names.sample(sources, int(len(sources) * duplicates)):
+        shutil.copyfile(path, os.path.join(duplicate_dir, 'copy_' + os.path.basename(path)))
+
+    season_dir = os.path.join(directory, 'library', 'Show', 'S01')
+    os.makedirs(season_dir)
+    number = 0
+    for shape in EPISODE_SHAPES:
+        for _ in range(episodes):
+            number += 1
+            base_name = shape(number)
+            ext = '.mkv' if number % 3 == 0 else '.mp4'
+            for suffix in (ext, '.nfo', '.srt', '.jpg'):
+                with open(os.path.join(season_dir, base_name + suffix), 'wb') as f:
+                    f.write(b'' if suffix == '.nfo' else base_name.encode() * 16)
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(params, f)
+    return params
+
+
+def _run_tool(name, func):
+    """
+    运行 func，返回端到端耗时和 metrics 中的分阶段统计。
+
+    :return: {'seconds', 'stages', 'counters'}
+    """
+    from metrics import metrics
+
+    metrics.reset()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    summary = metrics.summary()
+    print(f"[{name}] {elapsed:.2f}s")
+    return {'seconds': elapsed,
+            'stages': {stage: {key: data[key] for key in ('count', 'seconds', 'mean', 'max')}
+                       for stage, data in summary['stages'].items()},
+            'counters': summary['counters']}
+
+
+def bench_tools(corpus_dir, workers=4):
+    """
+    在合成语料的副本上端到端运行各个工具（语料本身不会被修改），每个工具使用新的空 catalog。
+
+    :param corpus_dir: make_media_corpus 生成的目录
+    :param workers: set_photo_date_all 的并发数
+    :return: 字典，键为工具名，值为 _run_tool 的结果
+    """
+    import grabber
+    import photo_date
+    import photo_duplicate
+    import season_rename
+    from catalog import Catalog
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_root:
+        work_dir = os.path.join(work_root, 'corpus')
+        shutil.copytree(corpus_dir, work_dir)
+        photo_dir = os.path.join(work_dir, 'photos')
+        video_dir = os.path.join(work_dir, 'videos')
+        season_dir = os.path.join(work_dir, 'library', 'Show', 'S01')
+        with Catalog(os.path.join(work_root, 'catalog.sqlite3')) as catalog:
+            results['find_duplicates_by_size'] = _run_tool(
+                'find_duplicates_by_size',
+                lambda: photo_duplicate.find_duplicates_by_size(work_dir, size_threshold=0, catalog=catalog))
+            if os.path.isdir(video_dir):
+                results['process_directory'] = _run_tool(
+                    'process_directory', lambda: grabber.process_directory(video_dir, catalog))
+            results['set_photo_date_all'] = _run_tool(
+                'set_photo_date_all', lambda: photo_date.set_photo_date_all(photo_dir, catalog, workers))
+            if os.path.isdir(video_dir):
+                results['set_photo_date_all/videos'] = _run_tool(
+                    'set_photo_date_all/videos', lambda: photo_date.set_photo_date_all(video_dir, catalog, workers))
+            # 第二次运行：所有文件都已经记录在 catalog 中
+            results['set_photo_date_all/warm'] = _run_tool(
+                'set_photo_date_all/warm', lambda: photo_date.set_photo_date_all(photo_dir, catalog, workers))
+        results['rename_mp4_files'] = _run_tool(
+            'rename_mp4_files', lambda: season_rename.rename_mp4_files(season_dir))
+    return results
+
+
+# cli.py 轻量子命令（rename、--help）的冷启动目标（秒，中位数）
+COLD_START_TARGET = 0.15
+
+
+def bench_cold_start(runs=10):
+    """
+    测量 cli.py 各子命令的冷启动时间（新进程，从启动到退出）。
+
+    :param runs: 每个命令运行的次数
+    :return: 字典，键为命令，值为耗时中位数（秒），另含 target 和 passed
+    """
+    import statistics
+    import subprocess
+    import sys
+
+    cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        season_dir = os.path.join(root, 'S01')
+        os.makedirs(season_dir)
+        commands = {
+            'python': [sys.executable, '-c', 'pass'],
+            'cli --help': [sys.executable, cli, '--help'],
+            'cli rename': [sys.executable, cli, 'rename', season_dir],
+            'cli date --help': [sys.executable, cli, 'date', '--help'],
+            'import photo_date': [sys.executable, '-c', 'import photo_date'],
+        }
+        for name, command in commands.items():
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run(command, check=True, stdout=subprocess.DEVNULL, cwd=os.path.dirname(cli))
+                timings.append(time.perf_counter() - start)
+            results[name] = statistics.median(timings)
+    results['target'] = COLD_START_TARGET
+    results['passed'] = max(results['cli --help'], results['cli rename']) <= COLD_START_TARGET
+    print("[cold_start] " + ", ".join(f"{name} {results[name] * 1000:.0f}ms" for name in commands) +
+          f", target {COLD_START_TARGET * 1000:.0f}ms: {'ok' if results['passed'] else 'MISSED'}")
+    return results
+
+
+def _git_revision():
+    import subprocess
+
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(old, new):
+    """
+    对比两次运行的结果，打印每项耗时的变化。
+
+    :param old: 旧的结果字典（--json 输出的内容）
+    :param new: 新的结果字典
+    """
+
+    def seconds(results):
+        flat = {}
+        for bench, data in results.get('benchmarks', {}).items():
+            if isinstance(data, dict) and 'seconds' in data:
+                flat[bench] = data['seconds']
+            elif isinstance(data, dict):
+                for key, value in data.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool) and \
+                            key not in ('mismatches', 'target'):
+                        flat[f"{bench}/{key}"] = value
+                    elif isinstance(value, dict) and 'seconds' in value:
+                        flat[f"{bench}/{key}"] = value['seconds']
+                    elif isinstance(value, (list, tuple)) and len(value) == 3:
+                        # bench_add_shooting_time: (文件数, 秒, MB/s)
+                        flat[f"{bench}/{key}"] = value[1]
+        return flat
+
+    before, after = seconds(old), seconds(new)
+    print(f"Comparing {old.get('revision')} -> {new.get('revision')}")
+    for name in sorted(before.keys() & after.keys()):
+        ratio = after[name] / before[name] if before[name] else float('inf')
+        print(f"  {name:<40} {before[name]:>9.3f}s -> {after[name]:>9.3f}s  ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the photo and video scripts")
+    parser.add_argument('--jpeg-corpus', help="Directory of large JPEGs; generated when omitted")
+    parser.add_argument('--jpeg-count', type=int, default=5)
+    parser.add_argument('--name-count', type=int, default=100000)
+    parser.add_argument('--latency', type=float, default=0.002, help="Simulated mount latency in seconds")
+    parser.add_argument('--corpus', help="Directory for the synthetic media corpus (reused when parameters match)")
+    parser.add_argument('--photos', type=int, default=200, help="Number of photos in the synthetic corpus")
+    parser.add_argument('--videos', type=int, default=8, help="Number of videos in the synthetic corpus")
+    parser.add_argument('--workers', type=int, default=4, help="Workers for set_photo_date_all")
+    parser.add_argument('--only', choices=['exif', 'parse_date', 'scan', 'tools', 'cold_start'],
+                        help="Run a single benchmark")
+    parser.add_argument('--json', metavar='FILE', help="Write machine-readable results to FILE")
+    parser.add_argument('--compare', metavar='FILE', help="Compare with results written earlier by --json")
+    args = parser.parse_args()
+
+    import json
+    import platform
+
+    results = {'revision': _git_revision(), 'python': platform.python_version(), 'platform': platform.platform(),
+               'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'benchmarks': {}}
+    benchmarks = results['benchmarks']
+    if args.only in (None, 'parse_date'):
+        benchmarks['parse_date'] = bench_parse_date(args.name_count)
+        if benchmarks['parse_date']['mismatches']:
+            raise SystemExit(1)
+    if args.only in (None, 'scan'):
+        benchmarks['scan'] = bench_scan(args.latency)
+    if args.only in (None, 'exif'):
+        corpus_dir = args.jpeg_corpus
+        if corpus_dir is None:
+            corpus_dir = os.path.join(tempfile.gettempdir(), 'pyscripts_bench_jpeg')
+            make_large_jpegs(corpus_dir, args.jpeg_count)
+        benchmarks['add_shooting_time'] = bench_add_shooting_time(corpus_dir)
+    if args.only in (None, 'cold_start'):
+        benchmarks['cold_start'] = bench_cold_start()
+    if args.only in (None, 'tools'):
+        corpus_dir = args.corpus or os.path.join(tempfile.gettempdir(), 'pyscripts_bench_corpus')
+        results['corpus'] = make_media_corpus(corpus_dir, args.photos, args.videos)
+        benchmarks['tools'] = bench_tools(corpus_dir, args.workers)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare_results(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
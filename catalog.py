@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+
+# 默认的目录缓存文件，放在本地磁盘上，避免在 NAS 上读写数据库
+DEFAULT_CATALOG_PATH = os.path.join(os.path.expanduser('~'), '.pyscripts_catalog.sqlite3')
+
+# 缓存的字段及其类型，新增字段会在打开数据库时自动补充
+FIELDS = {
+    'shooting_time': 'TEXT',  # parse_date 解析出的拍摄时间 yyyyMMdd_HHmmss
+    'date_state': 'TEXT',  # set_photo_date 的处理结果: tagged / no_date
+    'probe': 'TEXT',  # ffprobe 结果（JSON）
+    'partial_hash': 'TEXT',  # 首尾若干 KB 的哈希
+    'content_hash': 'TEXT',  # 全量内容哈希
+    'image_hash': 'TEXT',  # 感知哈希 dHash:pHash（十六进制）
+    'video_signature': 'TEXT',  # 视频指纹: 时长|采样时间:dHash,...
+    'thumb_done': 'INTEGER',  # 是否已生成缩略图
+}
+
+# 每累计多少次写入提交一次事务
+COMMIT_INTERVAL = 500
+
+
+def stat_key(st):
+    """
+    从 os.stat 结果中提取用于判断文件是否变化的键。
+
+    :param st: os.stat_result 或 os.DirEntry.stat() 的结果
+    :return: (size, mtime_ns, inode)
+    """
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class Catalog:
+    """
+    以 SQLite 保存的文件目录缓存，键为文件路径，并记录 (size, mtime, inode)。
+
+    文件的大小、修改时间或 inode 发生变化时，之前缓存的字段全部失效。
+    """
+
+    def __init__(self, db_path=DEFAULT_CATALOG_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER)'
+        )
+        existing = {row[1] for row in self._conn.execute('PRAGMA table_info(files)')}
+        for name, column_type in FIELDS.items():
+            if name not in existing:
+                self._conn.execute(f'ALTER TABLE files ADD COLUMN {name} {column_type}')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS files_size ON files(size)')
+        self._conn.commit()
+
+    def get(self, path, st=None):
+        """
+        获取文件的缓存记录。
+
+        :param path: 文件路径
+        :param st: 文件的 stat 结果，为 None 时自动调用 os.stat
+        :return: 字段字典；文件不在缓存中或已经变化时返回 None
+        """
+        if st is None:
+            st = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT size, mtime_ns, inode, {", ".join(FIELDS)} FROM files WHERE path = ?', (path,)
+            ).fetchone()
+        if row is None or tuple(row[:3]) != stat_key(st):
+            return None
+        return dict(zip(FIELDS, row[3:]))
+
+    def update(self, path, st=None, **fields):
+        """
+        更新文件的缓存字段。文件已经变化时，旧记录会被替换。
+
+        :param path: 文件路径
+        :param st: 文件的 stat 结果，为 None 时自动调用 os.stat
+        :param fields: 要写入的字段，见 FIELDS
+        """
+        for name in fields:
+            if name not in FIELDS:
+                raise KeyError(f"Unknown catalog field: {name}")
+        if st is None:
+            st = os.stat(path)
+        key = stat_key(st)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, inode FROM files WHERE path = ?', (path,)
+            ).fetchone()
+            if row is None or tuple(row) != key:
+                values = {name: fields.get(name) for name in FIELDS}
+                self._conn.execute(
+                    f'INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, {", ".join(values)}) '
+                    f'VALUES (?, ?, ?, ?{", ?" * len(values)})',
+                    (path, *key, *values.values())
+                )
+            elif fields:
+                self._conn.execute(
+                    f'UPDATE files SET {", ".join(f"{name} = ?" for name in fields)} WHERE path = ?',
+                    (*fields.values(), path)
+                )
+            self._pending += 1
+            if self._pending >= COMMIT_INTERVAL:
+                self._conn.commit()
+                self._pending = 0
+
+    def paths_with_size(self, size):
+        """
+        查找缓存中指定大小的文件（记录可能已经过期，使用前需要用 get 校验）。
+
+        :param size: 文件大小
+        :return: 文件路径列表
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT path FROM files WHERE size = ?', (size,)).fetchall()
+        return [row[0] for row in rows]
+
+    def remove(self, path):
+        """
+        删除文件的缓存记录。
+
+        :param path: 文件路径
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM files WHERE path = ?', (path,))
+            self._pending += 1
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
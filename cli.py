@@ -0,0 +1,195 @@
+"""
+所有工具的统一入口::
+
+    python cli.py date DIR [--workers N] [--plan FILE | --apply FILE]
+    python cli.py dedupe DIR [--preferred-dir DIR] [--near-images] [--near-videos] [--dry-run]
+    python cli.py thumbs DIR [--best-frame] [--force]
+    python cli.py covers DIR [--library]
+    python cli.py rename DIR [--library] [--plan FILE | --apply FILE]
+    python cli.py watch DIR [--poll]
+
+本模块只导入 argparse 和只依赖标准库的 journal、metrics；各个工具模块（以及 Pillow、ffmpeg-python、NumPy）
+在对应的子命令真正执行时才导入，--help 和 rename 这样的轻量命令可以很快启动。
+"""
+import argparse
+import sys
+
+import journal
+import metrics
+
+
+def _catalog(args):
+    from catalog import Catalog
+
+    return Catalog(args.catalog) if args.catalog else Catalog()
+
+
+def _specified(**kwargs):
+    """去掉命令行没有指定（值为 None）的参数，由各模块的函数使用自己的默认值"""
+    return {name: value for name, value in kwargs.items() if value is not None}
+
+
+def run_date(args):
+    import photo_date
+
+    metrics.configure(args)
+    with _catalog(args) as catalog:
+        if args.plan:
+            journal.write_plan(args.plan, 'photo_date', photo_date.plan_photo_dates(args.dir, catalog))
+        elif args.apply:
+            journal.apply_plan(args.apply, photo_date.PLAN_HANDLERS, catalog, workers=args.workers,
+                               clean_temp=args.clean_temp)
+        else:
+            photo_date.set_photo_date_all(args.dir, catalog, args.workers)
+    metrics.report(args)
+
+
+def run_dedupe(args):
+    import photo_duplicate
+
+    metrics.configure(args)
+    with _catalog(args) as catalog:
+        if args.apply:
+            journal.apply_plan(args.apply, catalog=catalog, clean_temp=args.clean_temp)
+            metrics.report(args)
+            return
+        if args.near_images:
+            for group in photo_duplicate.find_near_duplicates(args.dir, catalog=catalog,
+                                                              **_specified(radius=args.radius)):
+                print("相近图片:", ", ".join(group))
+        if args.near_videos:
+            for group in photo_duplicate.find_video_near_duplicates(args.dir, catalog=catalog):
+                print("重复视频:", ", ".join(group))
+        if args.near_images or args.near_videos:
+            metrics.report(args)
+            return
+
+        stats = {}
+        duplicates = photo_duplicate.find_duplicates_by_size(args.dir, int(args.min_size * 1024 * 1024),
+                                                             stats=stats, catalog=catalog,
+                                                             **_specified(workers=args.workers))
+    photo_duplicate.print_stats(stats)
+    preferred_dir = args.preferred_dir or args.dir
+    if not duplicates:
+        print("没有找到内容相同的重复文件。")
+    elif args.dry_run:
+        for files in duplicates.values():
+            print("重复文件:", ", ".join(files))
+    elif args.plan:
+        journal.write_plan(args.plan, 'photo_duplicate',
+                           photo_duplicate.plan_delete_duplicates(duplicates, preferred_dir))
+    else:
+        photo_duplicate.delete_duplicates(duplicates, preferred_dir)
+    metrics.report(args)
+
+
+def run_thumbs(args):
+    import grabber
+
+    metrics.configure(args)
+    with _catalog(args) as catalog:
+        # --width 0 表示保持视频原始尺寸
+        options = _specified(workers=args.workers, width=args.width)
+        if options.get('width') == 0:
+            options['width'] = None
+        grabber.process_directory(args.dir, catalog, force=args.force, best_frame=args.best_frame, **options)
+    metrics.report(args)
+
+
+def run_covers(args):
+    import grabber
+
+    if args.library:
+        grabber.find_all_season_covers(args.dir, **_specified(workers=args.workers))
+    else:
+        grabber.find_season_cover(args.dir)
+
+
+def run_rename(args):
+    import season_rename
+
+    if args.plan:
+        if args.library:
+            journal.write_plan(args.plan, 'season_rename',
+                               season_rename.plan_rename_library(args.dir, **_specified(workers=args.workers)))
+        else:
+            journal.write_plan(args.plan, 'season_rename', season_rename.plan_rename_mp4_files(args.dir))
+    elif args.apply:
+        journal.apply_plan(args.apply, clean_temp=args.clean_temp)
+    elif args.library:
+        season_rename.rename_library(args.dir, **_specified(workers=args.workers))
+    else:
+        season_rename.rename_mp4_files(args.dir)
+
+
+def run_watch(args):
+    import watch
+
+    with _catalog(args) as catalog:
+        watch.watch(args.dir, catalog, poll=args.poll, **_specified(settle=args.settle, interval=args.interval))
+
+
+def build_parser():
+    # 默认值为 None 的参数由各模块使用自己的常量（THUMB_WORKERS、SEASON_WORKERS 等），解析参数时不必导入模块
+    parser = argparse.ArgumentParser(prog='cli.py', description="Photo and video library tools")
+    parser.add_argument('--catalog', metavar='PATH', help="Catalog database (default: ~/.pyscripts_catalog.sqlite3)")
+    commands = parser.add_subparsers(dest='command', required=True, metavar='COMMAND')
+
+    date = commands.add_parser('date', help="Write shooting time parsed from file names into photos and videos")
+    date.add_argument('dir')
+    date.add_argument('--workers', type=int, default=1)
+    journal.add_arguments(date)
+    metrics.add_arguments(date)
+    date.set_defaults(func=run_date)
+
+    dedupe = commands.add_parser('dedupe', help="Find and delete duplicate files")
+    dedupe.add_argument('dir')
+    dedupe.add_argument('--preferred-dir', help="Directory whose copies are preferred (default: DIR)")
+    dedupe.add_argument('--min-size', type=float, default=10, metavar='MB', help="Ignore files up to this size")
+    dedupe.add_argument('--workers', type=int, help="Threads reading files")
+    dedupe.add_argument('--dry-run', action='store_true', help="Only list duplicate groups")
+    dedupe.add_argument('--near-images', action='store_true', help="List visually similar images instead")
+    dedupe.add_argument('--near-videos', action='store_true', help="List re-encoded duplicate videos instead")
+    dedupe.add_argument('--radius', type=int, help="Maximum hash distance for --near-images")
+    journal.add_arguments(dedupe)
+    metrics.add_arguments(dedupe)
+    dedupe.set_defaults(func=run_dedupe)
+
+    thumbs = commands.add_parser('thumbs', help="Generate video thumbnails")
+    thumbs.add_argument('dir')
+    thumbs.add_argument('--workers', type=int, help="ffmpeg processes running at once")
+    thumbs.add_argument('--width', type=int, help="Thumbnail width, 0 to keep the video size")
+    thumbs.add_argument('--force', action='store_true', help="Regenerate thumbnails that are up to date")
+    thumbs.add_argument('--best-frame', action='store_true', help="Pick the best of several sampled frames")
+    metrics.add_arguments(thumbs)
+    thumbs.set_defaults(func=run_thumbs)
+
+    covers = commands.add_parser('covers', help="Copy the first image of each season as its cover")
+    covers.add_argument('dir', help="Series directory, or library directory with --library")
+    covers.add_argument('--library', action='store_true', help="DIR contains series directories")
+    covers.add_argument('--workers', type=int, help="Series indexed at once with --library")
+    covers.set_defaults(func=run_covers)
+
+    rename = commands.add_parser('rename', help="Rename episodes according to Jellyfin rules")
+    rename.add_argument('dir', help="Season directory, or series/library directory with --library")
+    rename.add_argument('--library', action='store_true', help="Process every Sxx directory below DIR")
+    rename.add_argument('--workers', type=int, help="Seasons processed at once with --library")
+    journal.add_arguments(rename)
+    rename.set_defaults(func=run_rename)
+
+    watch = commands.add_parser('watch', help="Tag and de-duplicate new photos as they are uploaded")
+    watch.add_argument('dir')
+    watch.add_argument('--poll', action='store_true', help="Poll instead of using inotify (use on SMB mounts)")
+    watch.add_argument('--interval', type=float, help="Seconds between polls")
+    watch.add_argument('--settle', type=float, help="Seconds a file must stay unchanged")
+    watch.set_defaults(func=run_watch)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
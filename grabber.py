@@ -1,66 +1,391 @@
+import argparse
 import os
 import shutil
 import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
+from catalog import Catalog
+from journal import temp_path
+from metrics import add_arguments as add_metrics_arguments, configure as configure_metrics, metrics, \
+    report as report_metrics
+from scanner import VIDEO_EXTENSIONS, entry_stat, scan
+from video_probe import probe_video, probe_videos, video_duration, video_size
 
-def capture_frame(video_path):
+# Default time (seconds) to grab the thumbnail frame at, 00:01:41
+CAPTURE_TIME = 101
+# Thumbnail width in pixels
+THUMB_WIDTH = 640
+# Number of ffmpeg processes to run at once
+THUMB_WORKERS = 4
+# Number of candidate frames scored in best-frame mode
+BEST_FRAME_CANDIDATES = 12
+# Number of series directories listed at once by find_all_season_covers
+COVER_WORKERS = 8
+# Seconds decoded after each seek in read_frames_at; stops ffmpeg decoding every input to the end
+FRAME_READ_WINDOW = 1
+
+
+def capture_time(duration):
     """
-    Capture a frame from the video at the specified time and save it as a JPG.
+    Choose where to grab the thumbnail frame.
+
+    :param duration: Video duration in seconds, or None when unknown
+    :return: Seek time in seconds
+    """
+    if duration is None or duration > CAPTURE_TIME:
+        return CAPTURE_TIME
+    # Shorter clips: take a frame a third of the way in
+    return duration / 3
+
+
+def thumb_path(video_path):
+    """
+    :return: Path of the thumbnail for the video (eg: 'S01E01-thumb.jpg')
+    """
+    return os.path.splitext(video_path)[0] + '-thumb.jpg'
+
+
+def thumb_output_path(video_path):
+    """
+    :return: Path to write the thumbnail to; raises RuntimeError rather than ever returning the video itself
+    """
+    output_path = thumb_path(video_path)
+    if os.path.normcase(os.path.abspath(output_path)) == os.path.normcase(os.path.abspath(video_path)):
+        raise RuntimeError(f"Thumbnail path is the video itself, not overwriting: {video_path}")
+    return output_path
+
+
+def thumb_is_current(video_path):
+    """
+    :return: True when the thumbnail exists and is not older than the video
+    """
+    try:
+        return os.stat(thumb_path(video_path)).st_mtime >= os.stat(video_path).st_mtime
+    except FileNotFoundError:
+        return False
+
+
+@metrics.timed('capture_frame')
+def capture_frame(video_path, catalog=None, width=THUMB_WIDTH):
+    """
+    Capture a frame from the video and save it as a JPG next to it.
+
+    Only keyframes are decoded when possible, so the frame is the first keyframe at or after the capture time.
+
+    :param video_path: Path to the input video file
+    :param catalog: Optional catalog.Catalog used to cache the ffprobe result
+    :param width: Scale the thumbnail down to this width, None to keep the video size
+    :return: Path of the thumbnail
+    """
+    output_path = thumb_output_path(video_path)
+    try:
+        duration = video_duration(probe_video(video_path, catalog))
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"Failed to probe {video_path}: {e}")
+        duration = None
+    time = f"{capture_time(duration):.3f}"
+    # Write to a temp file first so an interrupted run never leaves a partial thumb that looks up to date
+    tmp_path = temp_path(output_path, '.jpg')
+    try:
+        # Keyframe-only decoding is much faster, but short clips may have no keyframe after the
+        # capture time, so fall back to decoding every frame
+        for keyframes_only in (True, False):
+            command = ['ffmpeg', '-loglevel', 'error']
+            if keyframes_only:
+                command += ['-skip_frame', 'nokey']
+            command += [
+                '-ss', str(time),
+                '-i', video_path,
+                '-frames:v', '1',
+                '-an',  # Disable audio
+                '-q:v', '3',
+            ]
+            if width:
+                command += ['-vf', f"scale='min({width},iw)':-2"]
+            command += [
+                '-update', '1',
+                '-y',  # Overwrite output files without asking
+                tmp_path
+            ]
+            subprocess.run(command, check=True)
+            if os.path.getsize(tmp_path) > 0:
+                break
+        else:
+            raise RuntimeError(f"No frame captured from {video_path}")
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"Frame captured at {time}s and saved to {output_path}")
+    return output_path
+
+
+@metrics.timed('read_frames')
+def read_frames(video_path, count, width, height=None, catalog=None, keyframes_only=True):
+    """
+    Decode count evenly spaced, downscaled frames in a single ffmpeg pass, piped as raw RGB.
 
     :param video_path: Path to the input video file
-    :param time: Time to capture the frame (format: HH:MM:SS or seconds)
-    """
-    # output_path: Path to save the output JPG file (eg: 'S01E01-thumb.jpg')
-    output_path = video_path.replace('.mp4', '-thumb.jpg').replace('.mkv', '-thumb.jpg')
-    time = '00:01:41'
-    command = [
-        'ffmpeg',
-        '-ss', str(time),
+    :param count: Number of frames to sample
+    :param width: Frame width
+    :param height: Frame height, None to keep the video aspect ratio
+    :param catalog: Optional catalog.Catalog used to cache the ffprobe result
+    :param keyframes_only: Decode keyframes only (much faster, frames snap to the nearest keyframe)
+    :return: numpy uint8 array of shape (frames, height, width, 3); may hold fewer than count frames
+    """
+    import numpy as np
+
+    probe = probe_video(video_path, catalog)
+    duration = video_duration(probe) or 0
+    if height is None:
+        size = video_size(probe)
+        if size is None:
+            raise RuntimeError(f"No video stream in {video_path}")
+        height = max(2, round(width * size[1] / size[0] / 2) * 2)
+    # Skip the first and last 5% (logos, credits)
+    start = duration * 0.05
+    span = duration * 0.9
+    command = ['ffmpeg', '-loglevel', 'error']
+    if keyframes_only:
+        command += ['-skip_frame', 'nokey']
+    command += ['-ss', f"{start:.3f}"]
+    if span > 0:
+        command += ['-t', f"{span:.3f}"]
+    filters = [f"scale={width}:{height}"]
+    if span > 0:
+        filters.insert(0, f"fps={count / span:.6f}")
+    command += [
         '-i', video_path,
-        '-frames:v', '1',
-        '-an',  # Disable audio
-        '-y',  # Overwrite output files without asking
-        output_path
+        '-an',
+        '-vf', ','.join(filters),
+        '-frames:v', str(count),
+        '-f', 'rawvideo',
+        '-pix_fmt', 'rgb24',
+        '-'
+    ]
+    result = subprocess.run(command, check=True, capture_output=True)
+    frame_size = width * height * 3
+    frames = len(result.stdout) // frame_size
+    return np.frombuffer(result.stdout[:frames * frame_size], dtype=np.uint8).reshape(frames, height, width, 3)
+
+
+@metrics.timed('read_frames_at')
+def read_frames_at(video_path, times, width, height):
+    """
+    Decode the frame at each of the given timestamps in a single ffmpeg process, piped as raw RGB.
+
+    Every timestamp is an accurate input seek (decoding starts at the preceding keyframe), so the
+    frames do not depend on the encoder's keyframe interval.
+
+    :param video_path: Path to the input video file
+    :param times: Timestamps in seconds
+    :param width: Frame width
+    :param height: Frame height
+    :return: numpy uint8 array of shape (frames, height, width, 3); holds fewer than len(times) frames
+             when a timestamp has no frame, in which case the frames cannot be matched to the timestamps
+    """
+    import numpy as np
+
+    command = ['ffmpeg', '-loglevel', 'error']
+    filters = []
+    for index, time in enumerate(times):
+        command += ['-ss', f"{time:.3f}", '-t', str(FRAME_READ_WINDOW), '-i', video_path]
+        filters.append(f"[{index}:v:0]trim=end_frame=1,scale={width}:{height},setsar=1,format=rgb24[v{index}]")
+    labels = ''.join(f"[v{index}]" for index in range(len(times)))
+    filters.append(f"{labels}concat=n={len(times)}:v=1:a=0[out]")
+    command += [
+        '-filter_complex', ';'.join(filters),
+        '-map', '[out]',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'rgb24',
+        '-'
     ]
-    subprocess.run(command, check=True)
-    print(f"Frame captured at {time} and saved to {output_path}")
+    result = subprocess.run(command, check=True, capture_output=True)
+    frame_size = width * height * 3
+    frames = len(result.stdout) // frame_size
+    return np.frombuffer(result.stdout[:frames * frame_size], dtype=np.uint8).reshape(frames, height, width, 3)
 
 
-def process_directory(directory):
+def score_frames(frames):
+    """
+    Score candidate thumbnail frames; black transitions and flat title cards score low.
+
+    :param frames: uint8 array of shape (frames, height, width, 3)
+    :return: float array of scores, higher is better
+    """
+    import numpy as np
+
+    luma = frames.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    brightness = luma.mean(axis=(1, 2))
+    contrast = luma.std(axis=(1, 2))
+    edges = (np.abs(np.diff(luma, axis=1)).mean(axis=(1, 2))
+             + np.abs(np.diff(luma, axis=2)).mean(axis=(1, 2)))
+    # Prefer mid-range brightness, then detail and contrast relative to the other candidates
+    exposure = 1 - np.abs(brightness - 128) / 128
+    scores = exposure + contrast / max(contrast.max(), 1e-6) + edges / max(edges.max(), 1e-6)
+    # Near-black, near-white and flat frames are never picked while anything else is available
+    scores[(brightness < 16) | (brightness > 240) | (contrast < 8)] -= 3
+    return scores
+
+
+@metrics.timed('capture_best_frame')
+def capture_best_frame(video_path, catalog=None, width=THUMB_WIDTH, candidates=BEST_FRAME_CANDIDATES):
+    """
+    Sample several frames in one decode pass and save the best scoring one as the thumbnail.
+
+    :param video_path: Path to the input video file
+    :param catalog: Optional catalog.Catalog used to cache the ffprobe result
+    :param width: Thumbnail width, None to keep the video size
+    :param candidates: Number of candidate frames to score
+    :return: Path of the thumbnail
+    """
+    from PIL import Image
+
+    output_path = thumb_output_path(video_path)
+    if width is None:
+        size = video_size(probe_video(video_path, catalog))
+        width = size[0] if size else THUMB_WIDTH
+    frames = read_frames(video_path, candidates, width, catalog=catalog)
+    if len(frames) == 0:
+        # Too few keyframes in the sampled range
+        frames = read_frames(video_path, candidates, width, catalog=catalog, keyframes_only=False)
+    if len(frames) == 0:
+        raise RuntimeError(f"No frame captured from {video_path}")
+    best = int(score_frames(frames).argmax())
+    tmp_path = temp_path(output_path, '.jpg')
+    try:
+        Image.fromarray(frames[best]).save(tmp_path, "jpeg", quality=90)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"Best of {len(frames)} frames (#{best}) saved to {output_path}")
+    return output_path
+
+
+def process_directory(directory, catalog=None, workers=THUMB_WORKERS, width=THUMB_WIDTH, force=False,
+                      best_frame=False):
     """
     Recursively process all MP4 files in the specified directory.
 
     :param directory: Path to the directory to process
+    :param catalog: Optional catalog.Catalog; unchanged videos that already have a thumb are skipped
+    :param workers: Maximum number of ffmpeg processes running at once
+    :param width: Thumbnail width, None to keep the video size
+    :param force: Regenerate thumbnails even when they are up to date
+    :param best_frame: Pick the best of several sampled frames instead of the frame at CAPTURE_TIME
+    :return: Number of thumbnails generated
+    """
+    video_paths = []
+    for entry in scan(directory, VIDEO_EXTENSIONS, skip_dirs=(), prefetch_stat=catalog is not None):
+        video_path = entry.path
+        if not force:
+            if catalog is not None:
+                cached = catalog.get(video_path, entry_stat(entry))
+                if cached is not None and cached['thumb_done'] and os.path.exists(thumb_path(video_path)):
+                    metrics.count('skipped')
+                    continue
+            if thumb_is_current(video_path):
+                metrics.count('skipped')
+                continue
+        video_paths.append(video_path)
+    video_paths.sort()
+    # Probe every video concurrently up front; capture_frame then reads the cached result
+    probe_videos(video_paths, catalog)
+
+    capture = capture_best_frame if best_frame else capture_frame
+
+    def run(video_path):
+        try:
+            with metrics.profiled(metrics.profile_target(video_path)):
+                capture(video_path, catalog, width)
+            metrics.count('thumbs')
+            return video_path, True
+        except (OSError, RuntimeError, subprocess.CalledProcessError) as e:
+            print(f"Failed to capture frame from {video_path}: {e}")
+            metrics.error(e)
+            return video_path, False
+
+    generated = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for video_path, ok in executor.map(run, video_paths):
+            if ok:
+                generated += 1
+                if catalog is not None:
+                    catalog.update(video_path, thumb_done=1)
+    if catalog is not None:
+        catalog.commit()
+    print(f"Generated {generated} of {len(video_paths)} thumbnails")
+    return generated
+
+
+def index_jpg_files(root_directory, workers=1):
+    """
+    List every directory under root_directory once and collect its JPG files.
+
+    :param root_directory: Directory to index
+    :param workers: Number of directories listed at once
+    :return: Dict mapping each directory path that contains JPG files to its sorted JPG file names
     """
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.lower().endswith('.mp4') or file.lower().endswith('.mkv'):
-                video_path = os.path.join(root, file)
-                capture_frame(video_path)
+    index = defaultdict(list)
+    for entry in scan(root_directory, ('.jpg',), skip_dirs=(), workers=workers):
+        index[os.path.dirname(entry.path)].append(entry.name)
+    for files in index.values():
+        files.sort()  # Sort files by name
+    return dict(index)
 
 
-def find_season_cover(series_root_directory):
+def find_season_cover(series_root_directory, index=None):
     """
-    Recursively find the first JPG image in each season directory and use it as the season cover image.
+    Find the first JPG image in each season directory and use it as the season cover image.
 
     :param series_root_directory: Path to the series root directory containing season directories
+    :param index: Result of index_jpg_files(series_root_directory), built when omitted
+    :return: Number of covers copied
     """
-    for root, dirs, _ in os.walk(series_root_directory):
-        for dir_name in dirs:
-            season_directory = str(os.path.join(root, dir_name))
-            for _, _, files in os.walk(season_directory):
-                files = sorted(files)  # Sort files by name
-                for file in files:
-                    if file.lower().endswith('.jpg'):
-                        image_path = os.path.join(season_directory, file)
-                        output_path = os.path.join(series_root_directory,
-                                                   f"season{dir_name.replace('S', '')}-poster.jpg")
-                        shutil.copyfile(image_path, output_path)
-                        print(f"Season cover copied from {image_path} to {output_path}")
-                        break
-                break
+    if index is None:
+        index = index_jpg_files(series_root_directory)
+    copied = 0
+    for season_directory in sorted(index):
+        files = index[season_directory]
+        if season_directory == series_root_directory or not files:
+            continue
+        dir_name = os.path.basename(season_directory)
+        image_path = os.path.join(season_directory, files[0])
+        output_path = os.path.join(series_root_directory, f"season{dir_name.replace('S', '')}-poster.jpg")
+        shutil.copyfile(image_path, output_path)
+        print(f"Season cover copied from {image_path} to {output_path}")
+        copied += 1
+    return copied
+
+
+def find_all_season_covers(library_root_directory, workers=COVER_WORKERS):
+    """
+    Run find_season_cover for every series directory directly under the library root.
+
+    Series directories are indexed concurrently.
+
+    :param library_root_directory: Path to the library containing series directories
+    :param workers: Number of series indexed at once
+    :return: Number of covers copied
+    """
+    with os.scandir(library_root_directory) as entries:
+        series_directories = sorted(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        indexes = list(executor.map(index_jpg_files, series_directories))
+    return sum(find_season_cover(series_directory, index)
+               for series_directory, index in zip(series_directories, indexes))
 
 
 if __name__ == '__main__':
-    process_directory(r'\\qunhui\usbshare1\剧集\熊出没')  # Replace with the path to your video directory
+    parser = argparse.ArgumentParser(description="Generate video thumbnails")
+    parser.add_argument('directory', nargs='?', default=r'\\qunhui\usbshare1\剧集\熊出没')  # Replace with the path to your video directory
+    parser.add_argument('--best-frame', action='store_true', help="Pick the best of several sampled frames")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_metrics(args)
+    with Catalog() as catalog:
+        process_directory(args.directory, catalog, best_frame=args.best_frame)
+    report_metrics(args)
     # find_season_cover(r'\\qunhui\usbshare1\剧集\猫和老鼠')  # Replace with the path to your video directory
@@ -0,0 +1,196 @@
+import struct
+import zlib
+
+# 读取文件头元数据时最多读取的字节数，超过后放弃查找
+HEADER_READ_LIMIT = 256 * 1024
+# read_jpeg_exif 读到 limit 仍未遇到图像数据时的返回值：EXIF 可能在更后面，不能当作没有 EXIF
+EXIF_BEYOND_LIMIT = object()
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+EXIF_HEADER = b'Exif\x00\x00'
+# DateTimeOriginal 标签
+DATE_TIME_ORIGINAL = 0x9003
+EXIF_IFD_POINTER = 0x8769
+
+
+def image_format(file_path):
+    """
+    根据文件头判断图像格式。
+
+    :return: 'JPEG'、'PNG'，其他格式返回 None
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(8)
+    if head[:2] == b'\xff\xd8':
+        return 'JPEG'
+    if head == PNG_SIGNATURE:
+        return 'PNG'
+    return None
+
+
+def read_jpeg_exif(file_path, limit=HEADER_READ_LIMIT):
+    """
+    只遍历 JPEG 的 marker 段，读取 APP1/EXIF 段，不解码图像。
+
+    :param file_path: JPEG 文件路径
+    :param limit: 最多读取的字节数
+    :return: 以 b'Exif\\x00\\x00' 开头的 EXIF 数据，没有 EXIF 时返回 None；
+             读到 limit 时还没有找到 EXIF 也没有到达图像数据，返回 EXIF_BEYOND_LIMIT
+    """
+    with open(file_path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        while f.tell() < limit:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            if marker[1] == 0xFF:
+                # 填充字节
+                f.seek(-1, 1)
+                continue
+            if marker[1] in (0xD9, 0xDA):
+                # EOI / SOS 之后是图像数据，不会再有 EXIF
+                return None
+            if 0xD0 <= marker[1] <= 0xD7 or marker[1] == 0x01:
+                # 没有长度字段的 marker
+                continue
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return None
+            length = struct.unpack('>H', length_bytes)[0] - 2
+            if marker[1] == 0xE1:
+                data = f.read(length)
+                if data.startswith(EXIF_HEADER):
+                    return data
+            else:
+                f.seek(length, 1)
+    return EXIF_BEYOND_LIMIT
+
+
+def read_png_metadata(file_path, limit=HEADER_READ_LIMIT):
+    """
+    只遍历 PNG 的 chunk 头，读取 eXIf 和 tEXt/zTXt/iTXt 块，不解码图像。
+
+    :param file_path: PNG 文件路径
+    :param limit: 最多读取的字节数（不包括跳过的 chunk 数据）
+    :return: 字典 {'exif': bytes 或 None, 'text': {关键字: 文本}}
+    """
+    metadata = {'exif': None, 'text': {}}
+    read = 0
+    with open(file_path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            return metadata
+        while read < limit:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, chunk_type = struct.unpack('>I4s', header)
+            read += 8
+            if chunk_type == b'IEND':
+                break
+            if chunk_type in (b'eXIf', b'tEXt', b'zTXt', b'iTXt') and read + length <= limit:
+                data = f.read(length)
+                read += length
+                f.seek(4, 1)  # CRC
+                try:
+                    if chunk_type == b'eXIf':
+                        metadata['exif'] = data
+                    else:
+                        key, value = _decode_text_chunk(chunk_type, data)
+                        metadata['text'][key] = value
+                except (ValueError, zlib.error):
+                    pass
+            else:
+                # 跳过图像数据等其他块，只读取块头
+                f.seek(length + 4, 1)
+    return metadata
+
+
+def _decode_text_chunk(chunk_type, data):
+    key, _, rest = data.partition(b'\x00')
+    key = key.decode('latin-1')
+    if chunk_type == b'tEXt':
+        return key, rest.decode('latin-1')
+    if chunk_type == b'zTXt':
+        return key, zlib.decompress(rest[1:]).decode('latin-1')
+    # iTXt: 压缩标志、压缩方法、语言标签、翻译后的关键字、文本
+    compressed, rest = rest[0], rest[2:]
+    _, _, rest = rest.partition(b'\x00')
+    _, _, text = rest.partition(b'\x00')
+    if compressed:
+        text = zlib.decompress(text)
+    return key, text.decode('utf-8')
+
+
+def read_exif_date(exif_data):
+    """
+    在 EXIF 数据中查找 DateTimeOriginal，不依赖 piexif 的完整解析。
+
+    :param exif_data: EXIF 数据，可以带 b'Exif\\x00\\x00' 头
+    :return: DateTimeOriginal 字符串（yyyy:MM:dd HH:mm:ss），没有时返回 None
+    """
+    if exif_data.startswith(EXIF_HEADER):
+        exif_data = exif_data[6:]
+    if exif_data[:2] == b'II':
+        endian = '<'
+    elif exif_data[:2] == b'MM':
+        endian = '>'
+    else:
+        return None
+    try:
+        ifd0 = struct.unpack(endian + 'I', exif_data[4:8])[0]
+        exif_ifd = _find_ifd_entry(exif_data, endian, ifd0, EXIF_IFD_POINTER)
+        if exif_ifd is None:
+            return None
+        entry = _find_ifd_entry(exif_data, endian, exif_ifd[1], DATE_TIME_ORIGINAL, raw=True)
+        if entry is None:
+            return None
+        count, value_offset = entry
+        if count <= 4:
+            value = value_offset[:count]
+        else:
+            offset = struct.unpack(endian + 'I', value_offset)[0]
+            value = exif_data[offset:offset + count]
+        return value.rstrip(b'\x00').decode('ascii')
+    except (struct.error, UnicodeDecodeError):
+        return None
+
+
+def _find_ifd_entry(data, endian, offset, tag, raw=False):
+    """返回 IFD 中指定标签的 (count, value)，raw 为 True 时 value 为原始 4 字节"""
+    entry_count = struct.unpack(endian + 'H', data[offset:offset + 2])[0]
+    for i in range(entry_count):
+        start = offset + 2 + i * 12
+        entry_tag, _, count = struct.unpack(endian + 'HHI', data[start:start + 8])
+        if entry_tag == tag:
+            value = data[start + 8:start + 12]
+            if raw:
+                return count, value
+            return count, struct.unpack(endian + 'I', value)[0]
+    return None
+
+
+def read_image_date(file_path):
+    """
+    只读取文件头，获取图像的拍摄时间。
+
+    JPEG 读取 EXIF DateTimeOriginal；PNG 先读取 EXIF，再读取 'Creation Time' 文本块。
+
+    :param file_path: 图像文件路径
+    :return: 原始时间字符串，没有时返回 None
+    """
+    file_format = image_format(file_path)
+    if file_format == 'JPEG':
+        exif_data = read_jpeg_exif(file_path)
+        if exif_data is EXIF_BEYOND_LIMIT:
+            # 前面的段很大（例如 ICC 配置文件），不限制读取范围再找一次
+            exif_data = read_jpeg_exif(file_path, limit=float('inf'))
+        return read_exif_date(exif_data) if exif_data else None
+    if file_format == 'PNG':
+        metadata = read_png_metadata(file_path)
+        if metadata['exif']:
+            date = read_exif_date(metadata['exif'])
+            if date:
+                return date
+        return metadata['text'].get('Creation Time')
+    return None
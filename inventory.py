@@ -0,0 +1,159 @@
+import os
+from array import array
+from collections import namedtuple
+
+from scanner import SCAN_WORKERS, SKIP_DIRS, entry_stat, scan
+
+# 与 os.stat_result 字段名相同，可以直接传给 catalog.stat_key
+FileStat = namedtuple('FileStat', ['st_size', 'st_mtime_ns', 'st_ino', 'st_dev'])
+
+
+class FileInventory:
+    """
+    紧凑的文件清单，适合数百万文件的扫描。
+
+    大小、修改时间、inode、设备号和目录编号保存在数组中，目录路径只保存一次，
+    文件名以 UTF-8 拼接在一个字节数组里，需要时才拼出完整路径。
+    """
+
+    def __init__(self):
+        self.directories = []
+        self._directory_ids = {}
+        self._names = bytearray()
+        self._name_offsets = array('q', [0])
+        self._sizes = array('q')
+        self._mtimes = array('q')
+        self._inodes = array('Q')
+        self._devices = array('Q')
+        self._directory_index = array('l')
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def add(self, directory, name, st):
+        """
+        添加一个文件。
+
+        :param directory: 文件所在目录
+        :param name: 文件名
+        :param st: os.stat_result 或 DirEntry.stat() 的结果
+        """
+        directory_id = self._directory_ids.get(directory)
+        if directory_id is None:
+            directory_id = len(self.directories)
+            self._directory_ids[directory] = directory_id
+            self.directories.append(directory)
+        self._names += os.fsencode(name)
+        self._name_offsets.append(len(self._names))
+        self._sizes.append(st.st_size)
+        self._mtimes.append(st.st_mtime_ns)
+        self._inodes.append(st.st_ino)
+        self._devices.append(st.st_dev)
+        self._directory_index.append(directory_id)
+
+    @classmethod
+    def scan(cls, directory, min_size=0, skip_dirs=SKIP_DIRS, workers=SCAN_WORKERS):
+        """
+        用 scanner.scan 遍历目录，复用 DirEntry 的 stat 结果，不再单独调用 os.path.getsize。
+
+        inode 和设备号来自 scanner.entry_stat，与 os.stat 的结果相同（Windows 上也是真实值），
+        因此可以用来去除硬链接，也可以直接写入 catalog。
+
+        :param directory: 要扫描的目录
+        :param min_size: 只记录不小于该大小的文件
+        :param skip_dirs: 跳过的目录名
+        :param workers: 同时列目录的线程数
+        :return: FileInventory
+        """
+        inventory = cls()
+        for entry in scan(directory, skip_dirs=skip_dirs, workers=workers, prefetch_stat=True):
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry_stat(entry)
+            except OSError as e:
+                print(f"无法处理文件 {entry.path}: {e}")
+                continue
+            if st.st_size >= min_size:
+                inventory.add(os.path.dirname(entry.path), entry.name, st)
+        return inventory
+
+    @property
+    def sizes(self):
+        import numpy as np
+        return np.frombuffer(self._sizes, dtype=np.int64) if len(self) else np.zeros(0, dtype=np.int64)
+
+    @property
+    def mtimes(self):
+        import numpy as np
+        return np.frombuffer(self._mtimes, dtype=np.int64) if len(self) else np.zeros(0, dtype=np.int64)
+
+    @property
+    def inodes(self):
+        import numpy as np
+        return np.frombuffer(self._inodes, dtype=np.uint64) if len(self) else np.zeros(0, dtype=np.uint64)
+
+    @property
+    def devices(self):
+        import numpy as np
+        return np.frombuffer(self._devices, dtype=np.uint64) if len(self) else np.zeros(0, dtype=np.uint64)
+
+    def name(self, index):
+        return os.fsdecode(bytes(self._names[self._name_offsets[index]:self._name_offsets[index + 1]]))
+
+    def path(self, index):
+        """
+        :return: 第 index 个文件的完整路径
+        """
+        return os.path.join(self.directories[self._directory_index[index]], self.name(index))
+
+    def stat(self, index):
+        """
+        :return: 第 index 个文件的 FileStat
+        """
+        index = int(index)
+        return FileStat(self._sizes[index], self._mtimes[index], self._inodes[index], self._devices[index])
+
+    def unique_links(self, indices=None):
+        """
+        去掉硬链接：(设备号, inode) 相同的文件只保留第一个。文件系统不提供 inode（inode 为 0）时不去重。
+
+        :param indices: 要处理的文件下标，None 表示全部
+        :return: 去重后的文件下标数组（升序）
+        """
+        import numpy as np
+
+        if indices is None:
+            indices = np.arange(len(self))
+        inodes = self.inodes[indices]
+        devices = self.devices[indices]
+        known = inodes != 0
+        linked = indices[known]
+        order = np.lexsort((linked, inodes[known], devices[known]))
+        linked = linked[order]
+        keys_inode = inodes[known][order]
+        keys_device = devices[known][order]
+        first = np.ones(len(linked), dtype=bool)
+        first[1:] = (keys_inode[1:] != keys_inode[:-1]) | (keys_device[1:] != keys_device[:-1])
+        return np.sort(np.concatenate([indices[~known], linked[first]]))
+
+    def size_groups(self, indices=None):
+        """
+        按文件大小排序后分组，只返回包含多个文件的组。
+
+        :param indices: 要分组的文件下标，None 表示全部
+        :return: 列表，每项为 (文件大小, 文件下标数组)
+        """
+        import numpy as np
+
+        if indices is None:
+            indices = np.arange(len(self))
+        if len(indices) == 0:
+            return []
+        sizes = self.sizes[indices]
+        order = np.argsort(sizes, kind='stable')
+        sorted_sizes = sizes[order]
+        starts = np.flatnonzero(np.r_[True, sorted_sizes[1:] != sorted_sizes[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        return [(int(sorted_sizes[start]), indices[order[start:end]])
+                for start, end in zip(starts, ends) if end - start > 1]
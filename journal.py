@@ -0,0 +1,277 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from metrics import metrics
+
+# 每批执行多少个操作后写一次提交记录
+APPLY_BATCH_SIZE = 200
+# 处理过程中生成的临时文件前缀
+TEMP_PREFIX = '.tmp-'
+# 旧版本固定使用的临时文件名
+LEGACY_TEMP_NAMES = ('tmp.jpg', 'tmp.mp4')
+
+# 新文件的默认权限（0666 去掉 umask）。os.umask 只能先设置再恢复，不是线程安全的，所以只在导入时读取一次
+_umask = os.umask(0o022)
+os.umask(_umask)
+DEFAULT_FILE_MODE = 0o666 & ~_umask
+
+
+def temp_path(file_path, suffix, like=None):
+    """
+    在 file_path 所在目录创建唯一的临时文件，避免并发处理时互相覆盖。
+
+    mkstemp 创建的文件权限为 0600，os.replace 之后会保留下来，其他用户（例如 Jellyfin）就无法读取；
+    因此改为与 like 文件相同的权限，like 为 None 或不存在时使用 DEFAULT_FILE_MODE。
+
+    :param file_path: 最终要写入的文件路径
+    :param suffix: 临时文件的扩展名
+    :param like: 权限参照的文件，通常是被替换的原文件
+    :return: 临时文件路径
+    """
+    fd, tmp_file = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=suffix, dir=os.path.dirname(file_path) or '.')
+    os.close(fd)
+    try:
+        shutil.copymode(like, tmp_file)
+    except (TypeError, FileNotFoundError):
+        os.chmod(tmp_file, DEFAULT_FILE_MODE)
+    return tmp_file
+
+
+def file_state(path):
+    """
+    :return: 计划中记录的文件状态 [size, mtime_ns]，用于执行前判断文件是否被修改过
+    """
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def write_plan(plan_path, tool, operations):
+    """
+    把操作列表写入计划文件（JSON Lines，第一行为文件头）。
+
+    :param plan_path: 计划文件路径
+    :param tool: 生成计划的工具名
+    :param operations: 操作字典列表，每个操作至少包含 op 和 path
+    :return: 写入的操作数
+    """
+    tmp_path = f"{plan_path}{TEMP_PREFIX}{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'tool': tool, 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                            'count': len(operations)}, ensure_ascii=False) + '\n')
+        for operation in operations:
+            f.write(json.dumps(operation, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, plan_path)
+    # 新计划从头执行，旧的日志作废
+    if os.path.exists(journal_path(plan_path)):
+        os.remove(journal_path(plan_path))
+    print(f"Planned {len(operations)} operations: {plan_path}")
+    return len(operations)
+
+
+def read_plan(plan_path):
+    """
+    :return: (文件头字典, 操作列表)
+    """
+    with open(plan_path, encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        operations = [json.loads(line) for line in f if line.strip()]
+    if header.get('count') != len(operations):
+        raise ValueError(f"Plan file is truncated: {plan_path}")
+    return header, operations
+
+
+def journal_path(plan_path):
+    return plan_path + '.journal'
+
+
+class Journal:
+    """
+    计划执行日志（预写日志）。
+
+    每批操作执行前写入 begin 记录，执行完并提交 catalog 后写入 commit 记录，每条记录都会 fsync。
+    重新执行时从最后一条 commit 记录之后继续；begin 之后没有 commit 的那一批会重新执行，
+    因此每种操作都必须可以重复执行。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.committed = 0
+        self.interrupted = None
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 写到一半时中断的最后一行
+                        break
+                    if 'commit' in record:
+                        self.committed = record['commit']
+                        self.interrupted = None
+                    elif 'begin' in record:
+                        self.interrupted = (record['begin'], record['end'])
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def begin(self, start, end):
+        self._write({'begin': start, 'end': end})
+
+    def failed(self, index, error):
+        self._write({'failed': index, 'error': str(error)})
+
+    def commit(self, end):
+        self._write({'commit': end})
+        self.committed = end
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def clean_temp_files(directories):
+    """
+    删除中断的运行留下的临时文件（.tmp-* 以及旧版本的 tmp.jpg / tmp.mp4）。
+
+    只检查计划涉及的目录，不需要重新扫描整个目录树。其他工具（包括 watch）正在处理同一目录时，
+    它们的临时文件也会被删除，所以 apply_plan 只在 clean_temp 为 True 时调用。
+
+    :param directories: 目录路径集合
+    :return: 删除的文件数
+    """
+    removed = 0
+    for directory in sorted(directories):
+        try:
+            with os.scandir(directory) as entries:
+                orphans = [entry.path for entry in entries
+                           if entry.name.startswith(TEMP_PREFIX) or entry.name in LEGACY_TEMP_NAMES]
+        except OSError:
+            continue
+        for path in orphans:
+            try:
+                os.remove(path)
+                removed += 1
+                print(f"Removed orphaned temp file: {path}")
+            except OSError as e:
+                print(f"无法删除临时文件 {path}: {e}")
+    return removed
+
+
+def apply_delete(operation, catalog=None):
+    """删除文件；keep 指向的保留文件必须仍然存在，文件已经不存在时视为已完成"""
+    if 'keep' in operation and not os.path.exists(operation['keep']):
+        raise FileNotFoundError(f"Kept copy is missing, not deleting: {operation['keep']}")
+    try:
+        os.remove(operation['path'])
+        print(f"已删除文件: {operation['path']}")
+    except FileNotFoundError:
+        pass
+    if catalog is not None:
+        catalog.remove(operation['path'])
+
+
+def apply_rename(operation, catalog=None):
+    """重命名文件；源文件不存在而目标文件存在时视为已完成"""
+    source, target = operation['path'], operation['target']
+    if not os.path.exists(source) and os.path.exists(target):
+        return
+    os.rename(source, target)
+    print(f"Renamed: {source} to {target}")
+    if catalog is not None:
+        catalog.remove(source)
+
+
+DEFAULT_HANDLERS = {
+    'delete': apply_delete,
+    'rename': apply_rename,
+}
+
+
+def apply_plan(plan_path, handlers=None, catalog=None, batch_size=APPLY_BATCH_SIZE, workers=1, clean_temp=False):
+    """
+    执行计划文件中的操作，从日志中最后一次提交的位置继续。
+
+    操作中带有 state（计划时的 [size, mtime_ns]）时，文件在计划之后被修改过的操作会被跳过。
+
+    :param plan_path: 计划文件路径
+    :param handlers: 操作名到处理函数 handler(operation, catalog) 的字典，补充或覆盖 DEFAULT_HANDLERS
+    :param catalog: 可选的 catalog.Catalog，传给处理函数，每批提交日志之前先提交
+    :param batch_size: 每批的操作数
+    :param workers: 同时执行操作的线程数
+    :param clean_temp: 执行前删除计划涉及目录中中断的运行留下的临时文件，确认没有其他工具在运行时才使用
+    :return: 统计字典，包含 applied、resumed、stale、errors
+    """
+    # cli.py 解析参数时就会导入本模块，concurrent.futures（连带 logging）只在执行计划时才导入
+    from concurrent.futures import ThreadPoolExecutor
+
+    _, operations = read_plan(plan_path)
+    handlers = {**DEFAULT_HANDLERS, **(handlers or {})}
+    counts = {'applied': 0, 'resumed': 0, 'stale': 0, 'errors': 0}
+
+    def run(index):
+        operation = operations[index]
+        try:
+            if 'state' in operation and file_state(operation['path']) != operation['state']:
+                return index, 'stale', None
+        except FileNotFoundError:
+            return index, 'stale', None
+        try:
+            with metrics.stage(f"apply_{operation['op']}"), \
+                    metrics.profiled(metrics.profile_target(operation['path'])):
+                handlers[operation['op']](operation, catalog)
+            return index, 'applied', None
+        except Exception as e:
+            metrics.error(e)
+            return index, 'errors', e
+
+    with Journal(journal_path(plan_path)) as journal, \
+            ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        counts['resumed'] = journal.committed
+        if journal.committed:
+            print(f"Resuming {plan_path} after {journal.committed} committed operations")
+        if journal.interrupted:
+            print(f"Re-running interrupted batch {journal.interrupted[0]}-{journal.interrupted[1]}")
+        if clean_temp:
+            clean_temp_files({os.path.dirname(operation['path']) or '.'
+                              for operation in operations[journal.committed:]})
+
+        for start in range(journal.committed, len(operations), batch_size):
+            end = min(start + batch_size, len(operations))
+            journal.begin(start, end)
+            for index, result, error in executor.map(run, range(start, end)):
+                counts[result] += 1
+                metrics.count(result)
+                if error is not None:
+                    print(f"Failed {operations[index]['op']} {operations[index]['path']}: {error}")
+                    journal.failed(index, error)
+            if catalog is not None:
+                catalog.commit()
+            journal.commit(end)
+            print(f"Applied {end}/{len(operations)} operations.")
+
+    print(f"Applied {counts['applied']} operations, resumed after {counts['resumed']}, "
+          f"skipped {counts['stale']} changed files, {counts['errors']} errors.")
+    return counts
+
+
+def add_arguments(parser):
+    """给 argparse 添加计划文件相关的参数（--plan、--apply、--clean-temp）"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--plan', metavar='FILE', help="Only write the planned operations to FILE")
+    group.add_argument('--apply', metavar='FILE', help="Apply (or resume) a plan written by --plan")
+    parser.add_argument('--clean-temp', action='store_true',
+                        help="With --apply, first delete leftover .tmp-* files in the plan's directories "
+                             "(only when no other tool or watch mode is running there)")
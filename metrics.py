@@ -0,0 +1,288 @@
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# 耗时直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+# Prometheus 指标名前缀
+PROMETHEUS_PREFIX = 'pyscripts'
+
+# 同一进程中同时只能有一个 cProfile 在运行（Python 3.12 起再次 enable 会抛出 ValueError）
+_profile_lock = threading.Lock()
+
+
+def _label_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_key(key):
+    name, labels = key
+    if not labels:
+        return name
+    return f"{name}{{{','.join(f'{k}={v}' for k, v in labels)}}}"
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+class Metrics:
+    """
+    轻量的运行统计：按阶段统计耗时（含直方图）、计数器，以及按 1/N 抽样的 cProfile。
+
+    所有方法都是线程安全的；进程池中的工作进程用 snapshot() 导出统计，由主进程 merge()。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.profile_every = 0
+        self.profile_dir = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self._counters = {}
+            # 阶段 -> [次数, 总耗时, 最大耗时, 各桶计数]
+            self._stages = {}
+            self._profile_counter = 0
+
+    def count(self, name, value=1, **labels):
+        """
+        增加计数器。
+
+        :param name: 计数器名，例如 files、bytes_read、errors
+        :param value: 增加的数量
+        :param labels: 标签，例如 type='ValueError'
+        """
+        key = _label_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def error(self, exc):
+        """按异常类型统计错误"""
+        self.count('errors', type=type(exc).__name__)
+
+    def observe(self, stage, seconds):
+        """记录某个阶段的一次耗时"""
+        with self._lock:
+            data = self._stages.get(stage)
+            if data is None:
+                data = self._stages[stage] = [0, 0.0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)]
+            data[0] += 1
+            data[1] += seconds
+            data[2] = max(data[2], seconds)
+            data[3][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    @contextmanager
+    def stage(self, stage):
+        """
+        统计代码块的耗时::
+
+            with metrics.stage('ffprobe'):
+                ...
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage):
+        """装饰器：统计函数每次调用的耗时"""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def profile_target(self, label):
+        """
+        每 profile_every 个文件抽样一个做 cProfile。
+
+        :param label: 被处理的文件路径，用于生成输出文件名
+        :return: 本次需要写入的 .prof 文件路径，不抽样时返回 None
+        """
+        if not self.profile_every or not self.profile_dir:
+            return None
+        with self._lock:
+            self._profile_counter += 1
+            sample = self._profile_counter
+        if sample % self.profile_every:
+            return None
+        return os.path.join(self.profile_dir, f"{sample:08d}-{os.path.basename(label)}.prof")
+
+    @contextmanager
+    def profiled(self, profile_path):
+        """
+        profile_path 不为 None 时，用 cProfile 记录代码块并写入该文件。
+
+        其他线程正在抽样时不等待，直接运行代码块，这次抽样被跳过。
+        """
+        if profile_path is None or not _profile_lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                os.makedirs(os.path.dirname(profile_path) or '.', exist_ok=True)
+                profiler.dump_stats(profile_path)
+        finally:
+            _profile_lock.release()
+
+    def snapshot(self):
+        """:return: 可以 pickle 的统计数据，用于从工作进程传回主进程"""
+        with self._lock:
+            return (dict(self._counters),
+                    {stage: [data[0], data[1], data[2], list(data[3])] for stage, data in self._stages.items()})
+
+    def merge(self, snapshot):
+        """合并 snapshot() 的结果"""
+        counters, stages = snapshot
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for stage, (count, total, longest, buckets) in stages.items():
+                data = self._stages.get(stage)
+                if data is None:
+                    data = self._stages[stage] = [0, 0.0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)]
+                data[0] += count
+                data[1] += total
+                data[2] = max(data[2], longest)
+                data[3] = [a + b for a, b in zip(data[3], buckets)]
+
+    def rate(self, name):
+        """:return: 计数器每秒的增长速度（从 reset 开始计算）"""
+        elapsed = time.time() - self.started
+        with self._lock:
+            total = sum(value for (key, _), value in self._counters.items() if key == name)
+        return total / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        """:return: 统计汇总字典"""
+        counters, stages = self.snapshot()
+        elapsed = time.time() - self.started
+        return {
+            'elapsed': elapsed,
+            'counters': {_format_key(key): value for key, value in sorted(counters.items())},
+            'rates': {_format_key(key): value / elapsed for key, value in sorted(counters.items())
+                      if not key[1] and elapsed > 0},
+            'stages': {stage: {'count': count, 'seconds': total, 'mean': total / count if count else 0.0,
+                               'max': longest,
+                               'buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], buckets))}
+                       for stage, (count, total, longest, buckets) in sorted(stages.items())},
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"Elapsed {summary['elapsed']:.1f}s")
+        for stage, data in summary['stages'].items():
+            print(f"  {stage:<16} {data['count']:>8} calls {data['seconds']:>9.2f}s "
+                  f"mean {data['mean'] * 1000:>8.1f}ms max {data['max'] * 1000:>9.1f}ms")
+        for name, value in summary['counters'].items():
+            rate = summary['rates'].get(name)
+            print(f"  {name:<32} {value:>12}" + (f" ({rate:.1f}/s)" if rate is not None else ''))
+
+    def write_json(self, path):
+        """把统计汇总写成 JSON 文件"""
+        _write_atomic(path, json.dumps(self.summary(), ensure_ascii=False, indent=2))
+
+    def write_prometheus(self, path):
+        """写成 Prometheus node_exporter textfile collector 可以读取的格式"""
+        counters, stages = self.snapshot()
+        lines = []
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            metric = f"{PROMETHEUS_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (key, labels), value in sorted(counters.items()):
+                if key == name:
+                    lines.append(f"{metric}{_prometheus_labels(labels)} {value}")
+        metric = f"{PROMETHEUS_PREFIX}_stage_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for stage, (count, total, _, buckets) in sorted(stages.items()):
+            cumulative = 0
+            for bound, bucket in zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], buckets):
+                cumulative += bucket
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {count}')
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}_last_run_timestamp_seconds {time.time():.0f}")
+        _write_atomic(path, '\n'.join(lines) + '\n')
+
+
+def _write_atomic(path, text):
+    # textfile collector 可能随时读取，先写临时文件再替换
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# 进程内共享的统计对象
+metrics = Metrics()
+
+
+def _after_fork():
+    # fork 时其他线程可能正持有锁，子进程中需要一把新锁
+    metrics._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def measured(func, *args, profile_path=None):
+    """
+    在进程池的工作进程中调用 func，并把本次调用的统计一起返回。
+
+    :return: (func 的返回值, metrics.snapshot())
+    """
+    metrics.reset()
+    with metrics.profiled(profile_path):
+        result = func(*args)
+    return result, metrics.snapshot()
+
+
+def add_arguments(parser):
+    """给 argparse 添加统计输出相关的参数"""
+    parser.add_argument('--metrics-json', metavar='FILE', help="Write a JSON timing summary to FILE")
+    parser.add_argument('--metrics-prom', metavar='FILE', help="Write a Prometheus textfile to FILE")
+    parser.add_argument('--profile-every', type=int, default=0, metavar='N',
+                        help="cProfile one file in every N (requires --profile-dir)")
+    parser.add_argument('--profile-dir', metavar='DIR', help="Directory for sampled .prof files")
+
+
+def configure(args):
+    """根据 add_arguments 添加的参数设置抽样 profile"""
+    metrics.reset()
+    metrics.profile_every = args.profile_every
+    metrics.profile_dir = args.profile_dir
+
+
+def report(args):
+    """运行结束时打印统计，并按参数导出 JSON / Prometheus 文件"""
+    metrics.print_summary()
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
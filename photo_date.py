@@ -1,38 +1,104 @@
+import argparse
+import multiprocessing
 import os
 import re
 import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from datetime import datetime
 
 import piexif
-from PIL import Image, PngImagePlugin, ImageFile
 
-ImageFile.LOAD_TRUNCATED_IMAGES = True
+from catalog import Catalog
+from scanner import entry_stat, scan
+from image_meta import EXIF_BEYOND_LIMIT, image_format, read_image_date, read_jpeg_exif
+from journal import add_arguments as add_plan_arguments, apply_plan, file_state, temp_path, write_plan
+from metrics import add_arguments as add_metrics_arguments, configure as configure_metrics, measured, metrics, \
+    report as report_metrics
+from video_probe import has_creation_time, probe_video, run_ffprobe
 
-import ffmpeg
+# 支持 +faststart 的容器
+FASTSTART_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+# 需要解码图像、适合放到进程池中处理的文件
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
 
 
-def set_creation_time(input_file, creation_time):
+def pillow():
+    """
+    延迟导入 Pillow：只有重新编码和 PNG 转换才需要，无损写入 JPEG 的 EXIF 不需要。
+
+    :return: PIL.Image 模块
+    """
+    from PIL import Image, ImageFile
+    ImageFile.LOAD_TRUNCATED_IMAGES = True
+    return Image
+
+
+def set_creation_time(input_file, creation_time, reencode=False, catalog=None):
+    """
+    写入视频的 creation_time 元数据。
+
+    默认只重新封装（-map 0 -c copy），不重新编码音视频流；MP4/MOV 同时把 moov 移到文件头。
+    容器不支持时退回只复制音视频流，仍然失败或写入后读不到 creation_time 时保留原文件。
+
+    :param input_file: 视频文件路径
+    :param creation_time: 拍摄时间，格式为 yyyyMMdd_HHmmss
+    :param reencode: 为 True 时使用 h264_nvenc 重新编码（旧的处理方式）
+    :param catalog: 可选的 catalog.Catalog，用于缓存 ffprobe 结果
+    :return: 是否写入了创建时间
+    """
+    import ffmpeg
+
     # 检查视频文件原来是否有创建时间
-    probe = ffmpeg.probe(input_file)
-    for stream in probe['streams']:
-        if stream['codec_type'] == 'video':
-            if 'tags' in stream:
-                if 'creation_time' in stream['tags']:
-                    # print("Creation time already exists:", stream['tags']['creation_time'])
-                    return False
-    tmp_file = os.path.join(os.path.dirname(input_file), 'tmp.mp4')
+    probe = probe_video(input_file, catalog)
+    if has_creation_time(probe):
+        # print("Creation time already exists:", input_file)
+        return False
+    ext = os.path.splitext(input_file)[1].lower()
+    tmp_file = temp_path(input_file, ext, like=input_file)
     try:
         creation_time = datetime.strptime(creation_time, "%Y%m%d_%H%M%S").strftime("%Y%m%dT%H:%M:%S")
-        ffmpeg.input(input_file).output(tmp_file, metadata=f'creation_time={creation_time}', vcodec='h264_nvenc').run()
-        os.remove(input_file)
-        os.rename(tmp_file, input_file)
+        metadata = f'creation_time={creation_time}'
+        source = ffmpeg.input(input_file)
+        if reencode:
+            attempts = [source.output(tmp_file, metadata=metadata, vcodec='h264_nvenc')]
+        else:
+            copy_args = {'c': 'copy', 'metadata': metadata}
+            if ext in FASTSTART_EXTENSIONS:
+                copy_args['movflags'] = '+faststart'
+            # 只保留容器一定能写入的音视频流，用于 -map 0 失败（例如带有不支持的数据流）时
+            streams = [source.video]
+            if any(stream['codec_type'] == 'audio' for stream in probe['streams']):
+                streams.append(source.audio)
+            attempts = [source.output(tmp_file, map=0, **copy_args),
+                        ffmpeg.output(*streams, tmp_file, **copy_args)]
+        for attempt in attempts:
+            try:
+                with metrics.stage('nvenc' if reencode else 'remux'):
+                    attempt.overwrite_output().run(quiet=True)
+                break
+            except ffmpeg.Error as e:
+                print("Remux failed, trying next mode:", input_file, e.stderr.decode('utf-8', 'replace')[-200:])
+                metrics.error(e)
+        else:
+            os.remove(tmp_file)
+            return False
+        tags = run_ffprobe(tmp_file).get('format', {}).get('tags', {})
+        if 'creation_time' not in tags:
+            print("Container cannot hold creation_time:", input_file)
+            os.remove(tmp_file)
+            return False
+        metrics.count('bytes_read', os.path.getsize(input_file))
+        metrics.count('bytes_written', os.path.getsize(tmp_file))
+        with metrics.stage('rename'):
+            os.replace(tmp_file, input_file)
         print(f"Added creation time: {creation_time}", input_file)
         return True
     except Exception as e:
         # 打印堆栈信息
         print("Error setting creation time:", e)
         traceback.print_exc()
-        os.remove(tmp_file)
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
         return False
 
 
@@ -62,263 +128,549 @@ def validate_and_fix_exif(exif_dict):
     return exif_dict
 
 
-def add_shooting_time(file_path, shooting_time=None):
-    # 打开图像文件
-    img = Image.open(file_path)
+def exif_with_shooting_time(exif_data, shooting_time=None):
+    """
+    在 EXIF 数据中设置拍摄时间（DateTimeOriginal）。
+
+    :param exif_data: 原有的 EXIF 数据或 piexif.load 可以读取的 JPEG 文件路径，没有时为 None
+    :param shooting_time: 拍摄时间，格式为 yyyyMMdd_HHmmss，为 None 时使用当前时间
+    :return: (新的 EXIF 字节, 写入的时间)；原来已经有有效的拍摄时间时返回 (None, None)
+    """
     # 检查图像文件是否包含EXIF信息
-    if 'exif' in img.info:
+    if exif_data:
         # 获取EXIF信息
-        exif_dict = piexif.load(img.info['exif'])
+        exif_dict = piexif.load(exif_data)
     else:
         # 创建一个新的EXIF字典
         exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "Interop": {}, "1st": {}, "thumbnail": None}
 
     # 检查是否有拍摄时间
-    if piexif.ExifIFD.DateTimeOriginal not in exif_dict['Exif'] or not validate_date(
+    if piexif.ExifIFD.DateTimeOriginal in exif_dict['Exif'] and validate_date(
             exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal].decode('utf-8'), "%Y:%m:%d %H:%M:%S"):
-        # 如果没有拍摄时间，则添加拍摄时间
-        if shooting_time is None:
-            shooting_time = datetime.now().strftime("%Y:%m:%d %H:%M:%S")
-        else:
-            shooting_time = datetime.strptime(shooting_time, "%Y%m%d_%H%M%S").strftime("%Y:%m:%d %H:%M:%S")
-        exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal] = shooting_time.encode('utf-8')
-
-        # 转换EXIF信息为字节
-        exif_bytes = piexif.dump(validate_and_fix_exif(exif_dict))
-        # 如果图像是RGBA模式，转换为RGB模式
-        if img.mode == 'RGBA':
-            img = img.convert('RGB')
-        # 保存图像文件，带有新的EXIF信息
-        tmp_file = os.path.join(os.path.dirname(file_path), 'tmp.jpg')
-        img.save(tmp_file, "jpeg", exif=exif_bytes)
-        os.remove(file_path)
-        os.rename(tmp_file, file_path)
-        print(f"Added shooting time: {shooting_time}", file_path)
-    else:
-        # print("Shooting time already exists.", exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal], file_path)
-        pass
+        # print("Shooting time already exists.", exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal])
+        return None, None
 
+    # 如果没有拍摄时间，则添加拍摄时间
+    if shooting_time is None:
+        shooting_time = datetime.now().strftime("%Y:%m:%d %H:%M:%S")
+    else:
+        shooting_time = datetime.strptime(shooting_time, "%Y%m%d_%H%M%S").strftime("%Y:%m:%d %H:%M:%S")
+    exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal] = shooting_time.encode('utf-8')
+
+    # 转换EXIF信息为字节
+    return piexif.dump(validate_and_fix_exif(exif_dict)), shooting_time
+
+
+def add_shooting_time(file_path, shooting_time=None, lossless=True):
+    """
+    写入 EXIF 拍摄时间（DateTimeOriginal）。
+
+    对 JPEG 文件只替换 APP1/EXIF 段，不重新编码图像；其他格式才需要解码后另存为 JPEG。
+
+    :param file_path: 图像文件路径
+    :param shooting_time: 拍摄时间，格式为 yyyyMMdd_HHmmss，为 None 时使用当前时间
+    :param lossless: 为 False 时总是解码并重新编码（旧的处理方式）
+    :return: 是否写入了拍摄时间
+    """
+    if lossless and image_format(file_path) == 'JPEG':
+        # 只读取 EXIF 段，不需要 Pillow
+        img = None
+        with metrics.stage('exif_read'):
+            exif_data = read_jpeg_exif(file_path)
+            if exif_data is EXIF_BEYOND_LIMIT:
+                # EXIF 段不在文件头的 HEADER_READ_LIMIT 之内，交给 piexif 读取整个文件
+                exif_data = file_path
+    else:
+        # 需要重新编码时才用 Pillow 打开
+        img = pillow().open(file_path)
+        exif_data = img.info.get('exif')
+    exif_bytes, shooting_time = exif_with_shooting_time(exif_data, shooting_time)
+    if exif_bytes is None:
+        if img is not None:
+            img.close()
+        return False
 
-def png_to_jpg(file_path):
+    tmp_file = temp_path(file_path, '.jpg', like=file_path)
+    try:
+        metrics.count('bytes_read', os.path.getsize(file_path))
+        if img is None:
+            # 只替换 EXIF 段，图像数据原样保留
+            with metrics.stage('exif_insert'):
+                piexif.insert(exif_bytes, file_path, tmp_file)
+        else:
+            with metrics.stage('decode'):
+                img.load()
+            # 如果图像是RGBA模式，转换为RGB模式
+            if img.mode == 'RGBA':
+                img = img.convert('RGB')
+            # 保存图像文件，带有新的EXIF信息
+            with metrics.stage('jpeg_encode'):
+                img.save(tmp_file, "jpeg", exif=exif_bytes)
+            img.close()
+        metrics.count('bytes_written', os.path.getsize(tmp_file))
+        with metrics.stage('rename'):
+            os.replace(tmp_file, file_path)
+    except Exception:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    print(f"Added shooting time: {shooting_time}", file_path)
+    return True
+
+
+def flatten_to_rgb(img, background=(255, 255, 255)):
+    """转换为 JPEG 可以保存的模式，透明区域填充为背景色"""
+    if img.mode in ('RGB', 'L'):
+        return img
+    if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+        if img.mode != 'RGBA':
+            img = img.convert('RGBA')
+        flat = pillow().new('RGB', img.size, background)
+        flat.paste(img, (0, 0), img)
+        return flat
+    return img.convert('RGB')
+
+
+def png_to_jpg(file_path, shooting_time=None):
+    """
+    把 PNG 转换为 JPEG，只解码一次，并直接写入拍摄时间。
+
+    :param file_path: PNG 文件路径，其他格式原样返回
+    :param shooting_time: 拍摄时间，格式为 yyyyMMdd_HHmmss，为 None 时不写入
+    :return: 转换后的 JPEG 文件路径
+    :raises FileExistsError: 同名的 JPEG 已经存在，不覆盖
+    """
     if not file_path.lower().endswith('.png'):
         return file_path
+    jpg_file_path = os.path.splitext(file_path)[0] + '.jpg'
+    if os.path.exists(jpg_file_path):
+        raise FileExistsError(f"JPEG already exists, not overwriting: {jpg_file_path}")
     # 打开PNG图像文件
-    img = Image.open(file_path)
-    # Convert image to RGB mode if it is in RGBA mode
-    if img.mode == 'RGBA':
-        img = img.convert('RGB')
-    # 创建一个新的JPG文件
-    jpg_file_path = file_path.lower().replace('.png', '.jpg')
-    # 保存图像文件为JPG格式
-    img.save(jpg_file_path, "jpeg")
+    with pillow().open(file_path) as img:
+        exif_bytes = None
+        if shooting_time is not None:
+            exif_bytes, shooting_time = exif_with_shooting_time(img.info.get('exif'), shooting_time)
+        if exif_bytes is None and img.info.get('exif'):
+            # 保留原有的 EXIF（已经包含有效的拍摄时间）
+            exif_bytes = piexif.dump(validate_and_fix_exif(piexif.load(img.info['exif'])))
+        metrics.count('bytes_read', os.path.getsize(file_path))
+        with metrics.stage('decode'):
+            img.load()
+        with metrics.stage('flatten'):
+            rgb = flatten_to_rgb(img)
+        # 创建一个新的JPG文件
+        tmp_file = temp_path(jpg_file_path, '.jpg', like=file_path)
+        try:
+            # 保存图像文件为JPG格式
+            with metrics.stage('jpeg_encode'):
+                if exif_bytes:
+                    rgb.save(tmp_file, "jpeg", exif=exif_bytes)
+                else:
+                    rgb.save(tmp_file, "jpeg")
+            metrics.count('bytes_written', os.path.getsize(tmp_file))
+            with metrics.stage('rename'):
+                os.replace(tmp_file, jpg_file_path)
+        except Exception:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
     print(f"Converted PNG to JPG: {jpg_file_path}")
+    if shooting_time:
+        print(f"Added shooting time: {shooting_time}", jpg_file_path)
     # 删除PNG文件
-    os.remove(file_path)
+    with metrics.stage('remove'):
+        os.remove(file_path)
     return jpg_file_path
 
 
-def validate_date(date_str, format="%Y%m%d_%H%M%S"):
+# 本次运行的"当前时间"，用于判断日期是否在未来，避免每次校验都调用 datetime.now()
+_now = None
+
+
+def current_time():
+    global _now
+    if _now is None:
+        _now = datetime.now()
+    return _now
+
+
+def reset_current_time():
+    """长时间运行时刷新缓存的当前时间"""
+    global _now
+    _now = None
+
+
+def validate_date(date_str, format="%Y%m%d_%H%M%S", now=None):
     try:
-        datetime.strptime(date_str, format)
         # 时间不能超过当前时间
-        if datetime.strptime(date_str, format) > datetime.now():
+        if datetime.strptime(date_str, format) > (now or current_time()):
             return False
         return True
     except ValueError:
         return False
 
 
-def remove_uuid(filename):
-    # 匹配有连字符的 UUID
-    uuid_with_hyphens = r'[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{12}'
-    # 匹配无连字符的 UUID（至少 32 位）
-    uuid_without_hyphens = r'[a-fA-F0-9]{32,}'
+# 匹配有连字符的 UUID
+UUID_WITH_HYPHENS = re.compile(r'[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{12}')
+# 匹配无连字符的 UUID（至少 32 位）
+UUID_WITHOUT_HYPHENS = re.compile(r'[a-fA-F0-9]{32,}')
+LEADING_TIMESTAMP = re.compile(r'^\d{10,}')
+TRAILING_TIMESTAMP = re.compile(r'\d{10,}$')
+
 
+def remove_uuid(filename):
     # 1. 检查并移除有连字符的 UUID
-    if re.search(uuid_with_hyphens, filename):
-        # 替换有连字符的 UUID
-        cleaned_filename = re.sub(uuid_with_hyphens, '', filename)
-        # 去除多余符号
+    cleaned_filename = UUID_WITH_HYPHENS.sub('', filename)
+    if cleaned_filename != filename:
         return cleaned_filename
 
     # 2. 检查并移除无连字符的 UUID
-    matches = re.finditer(uuid_without_hyphens, filename)
-    for match in matches:
+    for match in UUID_WITHOUT_HYPHENS.finditer(filename):
         uuid = match.group()
         if len(uuid) == 32:
-            cleaned_filename = filename.replace(uuid, '')
-            # 去除多余符号
-            return cleaned_filename
+            return filename.replace(uuid, '')
         if len(uuid) >= 42:
             # 检查是否是时间戳，前后是否紧邻数字
-            if re.search(r'^\d{10,}', uuid):
+            if LEADING_TIMESTAMP.search(uuid):
                 # 开头包含时间戳，去除UUID最后的32个字符
-                cleaned_filename = filename.replace(uuid[-32:], '')
-                return cleaned_filename
-            if re.search(r'\d{10,}$', uuid):
+                return filename.replace(uuid[-32:], '')
+            if TRAILING_TIMESTAMP.search(uuid):
                 # 结尾包含UUID，去除最前的32个字符
-                cleaned_filename = filename.replace(uuid[:32], '')
-                return cleaned_filename
+                return filename.replace(uuid[:32], '')
     # 未匹配到 UUID，返回原文件名
     return filename
 
 
+def _checked(shooting_time, now):
+    """校验 yyyyMMdd_HHmmss 格式的时间，按固定位置切分，比 strptime 快得多"""
+    try:
+        dt = datetime(int(shooting_time[0:4]), int(shooting_time[4:6]), int(shooting_time[6:8]),
+                      int(shooting_time[9:11]), int(shooting_time[11:13]), int(shooting_time[13:15]))
+    except ValueError:
+        return None
+    # 时间不能超过当前时间
+    return shooting_time if dt <= now else None
+
+
+def _timestamp(digits, now):
+    shooting_time = datetime.fromtimestamp(int(digits) / 1000).strftime("%Y%m%d_%H%M%S")
+    return _checked(shooting_time, now)
+
+
+# 文件名中的日期格式，按顺序尝试，返回 None 时继续尝试下一个，抛出 ValueError 时停止。
+# 每项为 (正则, 需要的最长连续数字位数, 转换函数)
+FILE_NAME_DATE_PATTERNS = [
+    # MYXJ_20180317141344_fast.jpg
+    (re.compile(r'(?<=_)\d{14}(?=_)'), 14,
+     lambda m, now: _checked(f"{m.group()[:8]}_{m.group()[8:]}", now)),
+    # 2021-05-12-21-48-15-930.jpg（忽略毫秒部分）
+    (re.compile(r'\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}-\d{3}'), 0,
+     lambda m, now: datetime.strptime(m.group()[:19], "%Y-%m-%d-%H-%M-%S").strftime("%Y%m%d_%H%M%S")),
+    # IMG_20210512_214815.jpg
+    (re.compile(r'\d{8}_\d{6}'), 0,
+     lambda m, now: _checked(m.group(), now)),
+    # 2021-05-12-214815930.mp4
+    (re.compile(r'(\d{4}-\d{2}-\d{2})-(\d{6})(\d{3})'), 0,
+     lambda m, now: datetime.strptime(f"{m.group(1)}-{m.group(2)}", "%Y-%m-%d-%H%M%S").strftime("%Y%m%d_%H%M%S")),
+    # 2303221954461692（假设年份为 2000 年之后）
+    (re.compile(r'(\d{2})(\d{2})(\d{2})(\d{6})(\d{4})'), 16,
+     lambda m, now: _checked(f"{int(m.group(1)) + 2000}{m.group(2)}{m.group(3)}_{m.group(4)}", now)),
+    # 照片20121128 172927.jpg
+    (re.compile(r'(\d{8})\s(\d{6})'), 0,
+     lambda m, now: _checked(f"{m.group(1)}_{m.group(2)}", now)),
+    # 20121128172927.jpg
+    (re.compile(r'20\d{12}(?=\.jpg)'), 14,
+     lambda m, now: _checked(f"{m.group()[:8]}_{m.group()[8:14]}", now)),
+    # 2021-05-12-214709.mp4
+    (re.compile(r'(\d{4}-\d{2}-\d{2})-(\d{6})'), 0,
+     lambda m, now: _checked(f"{m.group(1)}_{m.group(2)}".replace('-', ''), now)),
+    # Screenshot_2015-04-27-09-24-58.jpeg
+    (re.compile(r'(\d{4}-\d{2}-\d{2})-(\d{2}-\d{2}-\d{2})'), 0,
+     lambda m, now: _checked(f"{m.group(1)}_{m.group(2)}".replace('-', ''), now)),
+]
+DIGITS = re.compile(r'\d+')
+
+
+def parse_file_name_date(file_name, now=None):
+    """
+    从文件名中解析拍摄时间。
+
+    :param file_name: 文件名（不含目录）
+    :param now: 晚于该时间的日期视为无效，为 None 时使用缓存的当前时间
+    :return: yyyyMMdd_HHmmss 格式的时间，无法解析时返回 None
+    """
+    if now is None:
+        now = current_time()
+    file_name = remove_uuid(file_name)
+    digit_runs = DIGITS.findall(file_name)
+    if not digit_runs:
+        return None
+    # 所有格式都至少需要 13 位数字
+    if sum(map(len, digit_runs)) < 13:
+        return None
+    # 匹配最长连续数字share_fd00214c34d7f7ffe1c138a6dbd194301733885973551
+    longest = max(digit_runs, key=len)
+    try:
+        for pattern, min_run, convert in FILE_NAME_DATE_PATTERNS:
+            if len(longest) < min_run:
+                continue
+            match = pattern.search(file_name)
+            if match:
+                shooting_time = convert(match, now)
+                if shooting_time:
+                    return shooting_time
+        # 16 位（例如 1726136788549698.jpg）或 13 位（例如 1380164325634.jpg）毫秒时间戳
+        if len(longest) == 16 or len(longest) == 13:
+            return _timestamp(longest, now)
+    except (ValueError, OverflowError, OSError):
+        pass
+    return None
+
+
+def parse_file_name_dates(file_names):
+    """
+    批量解析文件名中的拍摄时间，所有文件名使用同一个"当前时间"。
+
+    :param file_names: 文件名列表
+    :return: 与 file_names 对应的拍摄时间列表，无法解析的为 None
+    """
+    now = datetime.now()
+    return [parse_file_name_date(file_name, now) for file_name in file_names]
+
+
+def normalize_time(value):
+    """
+    把元数据中的时间转换为 yyyyMMdd_HHmmss 格式。
+
+    :param value: EXIF 格式（yyyy:MM:dd HH:mm:ss）或 yyyyMMdd_HHmmss 格式的时间
+    :return: 转换后的时间，无法识别时返回 None
+    """
+    for format in ("%Y:%m:%d %H:%M:%S", "%Y%m%d_%H%M%S"):
+        try:
+            return datetime.strptime(value.strip(), format).strftime("%Y%m%d_%H%M%S")
+        except ValueError:
+            pass
+    return None
+
+
+@metrics.timed('parse_date')
 def parse_date(file_path):
     # 尝试获取拍摄时间，返回格式为 yyyyMMdd_HHmmss
     if file_path.lower().endswith('.png'):
-        #     尝试解析元数据
-        img = Image.open(file_path)
-        if 'exif' in img.info:
-            exif_dict = piexif.load(img.info['exif'])
-            if piexif.ExifIFD.DateTimeOriginal in exif_dict['Exif']:
-                return exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal].decode('utf-8')
-        metadata = {}
-        # 提取 tEXt、zTXt 和 iTXt 块
-        for key, value in img.info.items():
-            if isinstance(value, PngImagePlugin.PngInfo):
-                for k, v in value.items():
-                    metadata[k] = v
-            else:
-                metadata[key] = value
-        # 尝试从元数据中获取拍摄时间
-        if 'Creation Time' in metadata:
-            return metadata['Creation Time']
-    # 获取文件名和扩展名
-    file_name = os.path.basename(file_path)
-    file_name = remove_uuid(file_name)
-    #     MYXJ_20180317141344_fast.jpg
-    match = re.search(r'(?<=_)\d{14}(?=_)', file_name)
-    if match:
-        # 将时间转换为日期 yyyyMMdd_HHmmss
-        if validate_date(match.group(), "%Y%m%d%H%M%S"):
-            return datetime.strptime(match.group(), "%Y%m%d%H%M%S").strftime("%Y%m%d_%H%M%S")
-    match = re.search(r'\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}-\d{3}', file_name)
-    if match:  # 提取匹配的时间部分
-        datetime_str = match.group()
-        # 转换为 datetime 格式（忽略毫秒部分）
-        dt = datetime.strptime(datetime_str[: 19], "%Y-%m-%d-%H-%M-%S")
-        # 格式化为目标日期格式
-        return dt.strftime("%Y%m%d_%H%M%S")
-    match = re.search(r'\d{8}_\d{6}', file_name)
-    if match:
-        if validate_date(match.group()):
-            return match.group()
-    # 正则表达式匹配日期和时间 2021-05-12-214815930.mp4
-    pattern = r"(\d{4}-\d{2}-\d{2})-(\d{6})(\d{3})"
-    match = re.search(pattern, file_name)
-    if match:
-        date_part = match.group(1)  # 日期部分
-        time_part = match.group(2)  # 时间部分 (小时、分钟、秒)
-        millis_part = match.group(3)  # 毫秒部分
-        # 将时间格式化为标准格式
-        return datetime.strptime(f"{date_part}-{time_part}", "%Y-%m-%d-%H%M%S").strftime("%Y%m%d_%H%M%S")
-
-    match = re.search(r'(\d{2})(\d{2})(\d{2})(\d{6})(\d{4})', file_name)
-    if match:
-        year = int(match.group(1)) + 2000  # 假设年份为 2000 年之后2303221954461692
-        month = match.group(2)
-        day = match.group(3)
-        time = match.group(4)[:6]  # 提取小时分钟秒
-        # 格式化为 yyyyMMdd_HHmmss
-        if validate_date(f"{year}{month}{day}_{time}"):
-            return f"{year}{month}{day}_{time}"
-    #     照片20121128 172927.jpg
-    # 正则表达式匹配日期和时间
-    pattern = r'(\d{8})\s(\d{6})'
-    match = re.search(pattern, file_name)
-
-    if match:
-        date_part = match.group(1)  # 日期部分 (yyyyMMdd)
-        time_part = match.group(2)  # 时间部分 (HHmmss)
-        if validate_date(f"{date_part}_{time_part}"):
-            return f"{date_part}_{time_part}"
-    pattern = r'(\d{8})_(\d{6})'
-    match = re.search(pattern, file_name)
-    if match:
-        date_part = match.group(1)  # 日期部分 (yyyyMMdd)
-        time_part = match.group(2)  # 时间部分 (HHmmss)
-        if validate_date(f"{date_part}_{time_part}"):
-            return f"{date_part}_{time_part}"
-
-    match = re.search(r'20\d{12}(?=\.jpg)', file_name)
-    if match:
-        date_part = match.group()[:8]  # 日期部分 (yyyyMMdd)
-        time_part = match.group()[8:14]
-        if validate_date(f"{date_part}_{time_part}"):
-            return f"{date_part}_{time_part}"
+        # 只读取 PNG 文件头中的 EXIF 和文本块，不解码图像
+        shooting_time = read_image_date(file_path)
+        if shooting_time:
+            shooting_time = normalize_time(shooting_time)
+            if shooting_time:
+                return shooting_time
+    return parse_file_name_date(os.path.basename(file_path))
 
-    # 2021-05-12-214709.mp4
-    match = re.search(r'(\d{4}-\d{2}-\d{2})-(\d{6})', file_name)
-    if match:
-        date_part = match.group(1)
-        time_part = match.group(2)
-        shooting_time = f"{date_part}_{time_part}".replace('-', '')
-        if validate_date(shooting_time):
-            return shooting_time
 
-    # Screenshot_2015-04-27-09-24-58.jpeg
-    match = re.search(r'(\d{4}-\d{2}-\d{2})-(\d{2}-\d{2}-\d{2})', file_name)
-    if match:
-        date_part = match.group(1)
-        time_part = match.group(2)
-        shooting_time = f"{date_part}_{time_part}".replace('-', '')
-        if validate_date(shooting_time):
-            return shooting_time
-
-        # 正则表达式匹配 17 位时间戳，例如 1726136788549698.jpg
-    # 匹配时间戳
-    # 匹配最长连续数字share_fd00214c34d7f7ffe1c138a6dbd194301733885973551
-    match = max(re.findall(r'\d+', file_name), key=len)
-    # match = re.search(r'1\d{15}', file_name)
-    if match:
-        if len(match) == 16:
-            timestamp = int(match)
-            shooting_time = datetime.fromtimestamp(timestamp / 1000).strftime("%Y%m%d_%H%M%S")
-            if validate_date(shooting_time):
-                return shooting_time
-        # 例如：1380164325634.jpg 包含时间戳日期
-        if len(match) == 13:
-            timestamp = int(match)
-            # 将时间戳转换为日期 yyyyMMdd_HHmmss
-            shooting_time = datetime.fromtimestamp(timestamp / 1000).strftime("%Y%m%d_%H%M%S")
-            if validate_date(shooting_time):
-                return shooting_time
-    return None
+def set_photo_date(file_path, catalog=None):
+    """
+    解析文件的拍摄时间并写入到文件元数据中。
 
+    :param catalog: 可选的 catalog.Catalog，用于缓存视频的 ffprobe 结果，只能在线程中共享
 
-def set_photo_date(file_path):
+    :return: (处理后的文件路径, 拍摄时间)，出错时返回 None
+    """
     # print("Processing:", file_path)
     try:
         shooting_time = parse_date(file_path)
         if shooting_time:
             try:
                 # print("Shooting time:", shooting_time)
-                file_path = png_to_jpg(file_path)
-                if file_path.lower().endswith('.jpg') or file_path.lower().endswith('.jpeg'):
-                    add_shooting_time(file_path, shooting_time)
-                elif file_path.lower().endswith('.mp4'):
-                    set_creation_time(file_path, shooting_time)
-                else:
-                    print(f"Unsupported file format: {file_path}")
+                file_path = write_photo_date(file_path, shooting_time, catalog)
             except Exception as e:
                 print("Error processing file:", file_path, e)
                 traceback.print_exc()
-    except:
-        pass
+                metrics.error(e)
+                return None
+        return file_path, shooting_time
+    except Exception as e:
+        metrics.error(e)
+        return None
+
+
+def write_photo_date(file_path, shooting_time, catalog=None):
+    """
+    把已经解析出的拍摄时间写入文件元数据。
+
+    :param file_path: 文件路径
+    :param shooting_time: 拍摄时间，格式为 yyyyMMdd_HHmmss
+    :param catalog: 可选的 catalog.Catalog，用于缓存视频的 ffprobe 结果
+    :return: 处理后的文件路径（PNG 会被转换为 JPG）
+    """
+    if file_path.lower().endswith('.png'):
+        # 转换的同时写入拍摄时间，不需要再次解码
+        file_path = png_to_jpg(file_path, shooting_time)
+    elif file_path.lower().endswith('.jpg') or file_path.lower().endswith('.jpeg'):
+        add_shooting_time(file_path, shooting_time)
+    elif file_path.lower().endswith('.mp4'):
+        set_creation_time(file_path, shooting_time, catalog=catalog)
+    else:
+        print(f"Unsupported file format: {file_path}")
+    return file_path
+
+
+def record_photo_date(catalog, file_path, result):
+    """
+    把 set_photo_date 的结果写入 catalog。
+
+    :param catalog: catalog.Catalog
+    :param file_path: 处理前的文件路径
+    :param result: set_photo_date 的返回值 (处理后的文件路径, 拍摄时间)
+    """
+    new_path, shooting_time = result
+    if new_path != file_path:
+        catalog.remove(file_path)
+    catalog.update(new_path, shooting_time=shooting_time, date_state='tagged' if shooting_time else 'no_date')
+
+
+def _iter_files(dir, catalog, counts):
+    """遍历目录，跳过 @eaDir 以及 catalog 中已处理且未变化的文件"""
+    for entry in scan(dir, prefetch_stat=catalog is not None):
+        if catalog is not None:
+            cached = catalog.get(entry.path, entry_stat(entry))
+            if cached is not None and cached['date_state'] is not None:
+                counts['skipped'] += 1
+                metrics.count('skipped')
+                continue
+        yield entry.path
+
+
+def set_photo_date_all(dir, catalog=None, workers=1):
+    """
+    处理目录中的所有文件。
+
+    workers 大于 1 时，图片交给进程池处理（解码/编码占用 CPU），
+    视频和其他文件交给线程池处理（主要等待 ffprobe 和 SMB）。
 
+    :param dir: 要处理的目录
+    :param catalog: 可选的 catalog.Catalog，已处理且未变化的文件会被跳过
+    :param workers: 并发数，1 表示在当前线程中逐个处理
+    :return: 统计字典，包含 processed、skipped、errors
+    """
+    counts = {'processed': 0, 'skipped': 0, 'errors': 0}
+    reset_current_time()
 
-def set_photo_date_all(dir):
-    idx = 0
-    for root, dirs, files in os.walk(dir):
-        dirs[:] = [d for d in dirs if d != '@eaDir']
-        for file in files:
-            file_path = os.path.join(root, file)
-            set_photo_date(file_path)
-            idx += 1
-            if idx % 100 == 0:
-                print(f"Processed {idx} files.")
+    def record(file_path, result):
+        counts['processed'] += 1
+        metrics.count('files')
+        if result is None:
+            counts['errors'] += 1
+        else:
+            metrics.count('tagged' if result[1] else 'no_date')
+            if catalog is not None:
+                record_photo_date(catalog, file_path, result)
+        if counts['processed'] % 100 == 0:
+            print(f"Processed {counts['processed']} files ({metrics.rate('files'):.1f} files/s).")
+
+    def run(file_path):
+        with metrics.profiled(metrics.profile_target(file_path)):
+            return set_photo_date(file_path, catalog)
+
+    if workers <= 1:
+        for file_path in _iter_files(dir, catalog, counts):
+            record(file_path, run(file_path))
+    else:
+        # fork 出的工作进程会继承其他线程正在启动 ffmpeg 时的管道，导致 subprocess 一直等待，
+        # 所以在支持的平台上从 forkserver 启动工作进程
+        context = multiprocessing.get_context('forkserver') \
+            if 'forkserver' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as image_pool, \
+                ThreadPoolExecutor(max_workers=workers) as io_pool:
+            # future -> (文件路径, 是否在进程池中运行)
+            pending = {}
+
+            def finish(future):
+                file_path, in_process = pending.pop(future)
+                result = future.result()
+                if in_process:
+                    # 工作进程中的统计随结果一起传回
+                    result, snapshot = result
+                    metrics.merge(snapshot)
+                record(file_path, result)
+
+            for file_path in _iter_files(dir, catalog, counts):
+                if file_path.lower().endswith(IMAGE_EXTENSIONS):
+                    future = image_pool.submit(measured, set_photo_date, file_path,
+                                               profile_path=metrics.profile_target(file_path))
+                    pending[future] = (file_path, True)
+                else:
+                    # 线程池中的任务可以共享 catalog（内部有锁）
+                    future = io_pool.submit(run, file_path)
+                    pending[future] = (file_path, False)
+                # 限制排队的任务数量，保持内存占用稳定
+                if len(pending) >= workers * 4:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finish(future)
+            for future in as_completed(list(pending)):
+                finish(future)
+
+    if catalog is not None:
+        catalog.commit()
+    print(f"Processed {counts['processed']} files, skipped {counts['skipped']} unchanged files, "
+          f"{counts['errors']} errors.")
+    return counts
+
+
+def plan_photo_dates(dir, catalog=None):
+    """
+    计划阶段：只解析文件名和 PNG 文件头中的拍摄时间，不修改任何文件。
+
+    没有拍摄时间的文件直接记入 catalog，不写入计划。
+
+    :param dir: 要处理的目录
+    :param catalog: 可选的 catalog.Catalog，已处理且未变化的文件会被跳过
+    :return: 操作列表，每项为 {'op': 'set_date', 'path', 'shooting_time', 'state'}
+    """
+    counts = {'skipped': 0}
+    reset_current_time()
+    operations = []
+    for file_path in _iter_files(dir, catalog, counts):
+        try:
+            shooting_time = parse_date(file_path)
+            state = file_state(file_path)
+        except Exception as e:
+            print("Error processing file:", file_path, e)
+            continue
+        if shooting_time:
+            operations.append({'op': 'set_date', 'path': file_path, 'shooting_time': shooting_time, 'state': state})
+        elif catalog is not None:
+            record_photo_date(catalog, file_path, (file_path, None))
+    if catalog is not None:
+        catalog.commit()
+    print(f"Skipped {counts['skipped']} unchanged files.")
+    return operations
+
+
+def apply_photo_date(operation, catalog=None):
+    """执行阶段：写入计划中的拍摄时间"""
+    file_path = operation['path']
+    new_path = write_photo_date(file_path, operation['shooting_time'], catalog)
+    if catalog is not None:
+        record_photo_date(catalog, file_path, (new_path, operation['shooting_time']))
+
+
+PLAN_HANDLERS = {'set_date': apply_photo_date}
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write shooting time parsed from file names into photos and videos")
+    parser.add_argument('dir', nargs='?', default=r'\temp')
+    parser.add_argument('--workers', type=int, default=1)
+    add_plan_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_metrics(args)
     # set_photo_date(r"87664848.png")
-    set_photo_date_all(r'\temp')
+    with Catalog() as catalog:
+        if args.plan:
+            write_plan(args.plan, 'photo_date', plan_photo_dates(args.dir, catalog))
+        elif args.apply:
+            apply_plan(args.apply, PLAN_HANDLERS, catalog, workers=args.workers, clean_temp=args.clean_temp)
+        else:
+            set_photo_date_all(args.dir, catalog, args.workers)
+    report_metrics(args)
@@ -1,30 +1,213 @@
+import argparse
+import hashlib
 import os
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
+from catalog import Catalog
+from grabber import read_frames_at
+from inventory import FileInventory
+from journal import add_arguments as add_plan_arguments, apply_delete, apply_plan, file_state, write_plan
+from metrics import add_arguments as add_metrics_arguments, configure as configure_metrics, metrics, \
+    report as report_metrics
+from scanner import IMAGE_EXTENSIONS, scan
+from video_probe import probe_video, video_duration
 
-def find_duplicates_by_size(directory, size_threshold=10 * 1024 * 1024):
+
+# 首尾各读取的字节数，用于快速排除大小相同但内容不同的文件
+PARTIAL_HASH_SIZE = 4 * 1024
+# 全量哈希时每次读取的块大小
+HASH_CHUNK_SIZE = 1024 * 1024
+# 并发读取文件的线程数，NAS 上过多并发反而会降低吞吐
+HASH_WORKERS = 8
+# dHash 的边长（8x8 = 64 位）
+DHASH_SIZE = 8
+# pHash 计算 DCT 时使用的图像边长
+PHASH_SIZE = 32
+# 每批计算感知哈希的图像数
+IMAGE_HASH_BATCH = 256
+# 相近图片允许的最大汉明距离
+NEAR_DUPLICATE_RADIUS = 6
+# near_hash_pairs 每次比较的最大矩阵元素数
+NEAR_PAIR_BLOCK = 1 << 20
+NEAR_DUPLICATE_EXTENSIONS = IMAGE_EXTENSIONS
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.avi')
+# 每个视频采样的帧数
+VIDEO_SIGNATURE_FRAMES = 16
+# 按时长分桶的宽度（秒）
+VIDEO_DURATION_BUCKET = 2
+# 视频指纹逐帧平均汉明距离的阈值
+VIDEO_DUPLICATE_DISTANCE = 8
+# 同时计算视频指纹的 ffmpeg 进程数
+VIDEO_SIGNATURE_WORKERS = 4
+
+
+@metrics.timed('partial_hash')
+def _partial_hash(file_path, file_size):
+    """
+    计算文件首尾各 PARTIAL_HASH_SIZE 字节的哈希。
+
+    :return: (摘要, 实际读取的字节数)
     """
-    找到指定目录中重复的文件，依据是文件大小相同且超过指定大小。
+    h = hashlib.blake2b(digest_size=32)
+    with open(file_path, 'rb') as f:
+        if file_size <= 2 * PARTIAL_HASH_SIZE:
+            # 小文件直接读完，此时的摘要就是全量摘要
+            data = f.read()
+            h.update(data)
+            return h.hexdigest(), len(data)
+        head = f.read(PARTIAL_HASH_SIZE)
+        f.seek(-PARTIAL_HASH_SIZE, os.SEEK_END)
+        tail = f.read(PARTIAL_HASH_SIZE)
+    h.update(head)
+    h.update(tail)
+    return h.hexdigest(), len(head) + len(tail)
+
+
+@metrics.timed('full_hash')
+def _full_hash(file_path, file_size):
+    """
+    流式计算整个文件的 BLAKE2b 哈希。
+
+    :return: (摘要, 实际读取的字节数)
+    """
+    h = hashlib.blake2b(digest_size=32)
+    read = 0
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+            read += len(chunk)
+    return h.hexdigest(), read
+
+
+def _refine_groups(groups, hash_func, stage_stats, workers, catalog=None, field=None, file_stats=None):
+    """
+    用 hash_func 对每组候选文件再分组，只保留仍有多个文件的组。
+
+    :param groups: 列表，每项为 (文件大小, [文件路径...])
+    :param hash_func: _partial_hash 或 _full_hash
+    :param stage_stats: 当前阶段的统计字典，会累加 files、cached 和 bytes_read
+    :param workers: 线程池大小
+    :param catalog: 可选的 catalog.Catalog，用于读取和保存哈希
+    :param field: 哈希在 catalog 中的字段名
+    :param file_stats: 文件路径到 os.stat 结果的字典，配合 catalog 使用
+    :return: 列表，每项为 (文件大小, 摘要, [文件路径...])
+    """
+    refined = defaultdict(list)
+    tasks = []
+    for size, paths in groups:
+        for path in paths:
+            if catalog is not None:
+                cached = catalog.get(path, file_stats[path])
+                if cached is not None and cached[field]:
+                    stage_stats['files'] += 1
+                    stage_stats['cached'] += 1
+                    metrics.count('skipped')
+                    refined[(size, cached[field])].append(path)
+                    continue
+            tasks.append((size, path))
+
+    def run(task):
+        size, path = task
+        try:
+            return size, path, hash_func(path, size)
+        except Exception as e:
+            print(f"无法读取文件 {path}: {e}")
+            metrics.error(e)
+            return size, path, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for size, path, result in executor.map(run, tasks):
+            if result is None:
+                continue
+            digest, read = result
+            stage_stats['files'] += 1
+            stage_stats['bytes_read'] += read
+            metrics.count('files')
+            metrics.count('bytes_read', read)
+            refined[(size, digest)].append(path)
+            if catalog is not None:
+                catalog.update(path, file_stats[path], **{field: digest})
+    return [(size, digest, paths) for (size, digest), paths in refined.items() if len(paths) > 1]
+
+
+def print_stats(stats):
+    """
+    打印各阶段处理的文件数和读取的字节数。
+
+    :param stats: find_duplicates_by_size 填充的统计字典
+    """
+    candidate_bytes = stats['size']['bytes']
+    for stage in ('size', 'partial', 'full'):
+        stage_stats = stats[stage]
+        print(f"[{stage}] 文件数: {stage_stats['files']}, 缓存命中: {stage_stats['cached']}, "
+              f"读取: {stage_stats['bytes_read'] / 1024 / 1024:.1f} MB")
+    read = stats['partial']['bytes_read'] + stats['full']['bytes_read']
+    if candidate_bytes:
+        print(f"共读取 {read / 1024 / 1024:.1f} MB，"
+              f"为候选文件总大小的 {read * 100 / candidate_bytes:.2f}%")
+
+
+def find_duplicates_by_size(directory, size_threshold=10 * 1024 * 1024, workers=HASH_WORKERS, stats=None,
+                            catalog=None):
+    """
+    找到指定目录中内容重复的文件。
+
+    分三个阶段逐步缩小范围：先按文件大小分组，再比较首尾若干 KB 的哈希，
+    最后只对仍然相同的候选文件计算全量 BLAKE2b 哈希。
 
     :param directory: 要扫描的目录路径
     :param size_threshold: 文件大小阈值（默认 10MB）
-    :return: 一个字典，键为文件大小，值为具有相同大小的文件列表
+    :param workers: 计算哈希的线程数
+    :param stats: 可选字典，用于返回各阶段的文件数和读取字节数
+    :param catalog: 可选的 catalog.Catalog，未变化的文件直接使用缓存的哈希
+    :return: 一个字典，键为文件内容摘要，值为内容相同的文件列表
     """
-    size_to_files = defaultdict(list)
+    if stats is None:
+        stats = {}
+    stats.update({
+        'size': {'scanned': 0, 'files': 0, 'cached': 0, 'bytes': 0, 'bytes_read': 0},
+        'partial': {'files': 0, 'cached': 0, 'bytes_read': 0},
+        'full': {'files': 0, 'cached': 0, 'bytes_read': 0},
+    })
+    # 遍历目录及子目录中的所有文件，同一文件的多个硬链接只保留一个
+    inventory = FileInventory.scan(directory, min_size=size_threshold + 1, skip_dirs=())
+    stats['size']['scanned'] = len(inventory)
 
-    # 遍历目录及子目录中的所有文件
-    for root, _, files in os.walk(directory):
-        for file in files:
-            file_path = os.path.join(root, file)
-            try:
-                file_size = os.path.getsize(file_path)
-                if file_size > size_threshold:
-                    size_to_files[file_size].append(file_path)
-            except Exception as e:
-                print(f"无法处理文件 {file_path}: {e}")
-
-    # 过滤出重复的文件（即具有相同大小的文件）
-    duplicates = {size: paths for size, paths in size_to_files.items() if len(paths) > 1}
+    # 第一阶段：大小相同的文件才可能重复
+    groups = []
+    file_stats = {} if catalog is not None else None
+    for size, indices in inventory.size_groups(inventory.unique_links()):
+        paths = sorted(inventory.path(i) for i in indices)
+        groups.append((size, paths))
+        stats['size']['files'] += len(paths)
+        stats['size']['bytes'] += size * len(paths)
+        if file_stats is not None:
+            for i in indices:
+                file_stats[inventory.path(i)] = inventory.stat(i)
+
+    # 第二阶段：比较首尾若干 KB
+    partial_groups = _refine_groups(groups, _partial_hash, stats['partial'], workers,
+                                    catalog, 'partial_hash', file_stats)
+
+    duplicates = {}
+    remaining = []
+    for size, digest, paths in partial_groups:
+        if size <= 2 * PARTIAL_HASH_SIZE:
+            # 小文件在第二阶段已经读完整个内容
+            duplicates[digest] = paths
+        else:
+            remaining.append((size, paths))
+
+    # 第三阶段：全量哈希
+    for size, digest, paths in _refine_groups(remaining, _full_hash, stats['full'], workers,
+                                              catalog, 'content_hash', file_stats):
+        duplicates[digest] = paths
+    if catalog is not None:
+        catalog.commit()
     return duplicates
 
 
@@ -32,25 +215,461 @@ def delete_duplicates(duplicates, preferred_dir):
     """
     删除重复文件，优先删除指定目录中的文件。
 
-    :param duplicates: 重复文件的字典，键为文件大小，值为具有相同大小的文件列表
+    :param duplicates: 重复文件的字典，键为文件内容摘要，值为内容相同的文件列表
+    :param preferred_dir: 优先删除的目录路径
+    """
+    for operation in plan_delete_duplicates(duplicates, preferred_dir):
+        try:
+            apply_delete(operation)
+        except Exception as e:
+            print(f"无法删除文件 {operation['path']}: {e}")
+
+
+def plan_delete_duplicates(duplicates, preferred_dir):
+    """
+    计划阶段：生成删除重复文件的操作，不修改任何文件。
+
+    :param duplicates: 重复文件的字典，键为文件内容摘要，值为内容相同的文件列表
     :param preferred_dir: 优先删除的目录路径
+    :return: 操作列表，每项为 {'op': 'delete', 'path', 'keep', 'state'}
     """
-    for size, files in duplicates.items():
+    operations = []
+    for digest, files in duplicates.items():
         # 按优先目录排序，优先删除 preferred_dir 中的文件
         files_sorted = sorted(files, key=lambda x: x.startswith(preferred_dir), reverse=True)
         # 保留第一个文件，删除其他文件
         for file_to_delete in files_sorted[1:]:
             try:
-                os.remove(file_to_delete)
-                print(f"已删除文件: {file_to_delete}")
-            except Exception as e:
+                state = file_state(file_to_delete)
+            except OSError as e:
                 print(f"无法删除文件 {file_to_delete}: {e}")
+                continue
+            operations.append({'op': 'delete', 'path': file_to_delete, 'keep': files_sorted[0], 'state': state})
         print(f"保留文件: {files_sorted[0]}")
+    return operations
+
+
+def find_existing_duplicates(file_path, catalog):
+    """
+    检查新文件是否与 catalog 中已有的文件内容相同，并把新文件的大小和哈希记录到 catalog。
+
+    只和大小相同的文件比较，先比较首尾若干 KB，相同时再比较全量哈希，哈希会缓存到 catalog。
+
+    :param file_path: 新文件路径
+    :param catalog: catalog.Catalog
+    :return: 内容相同的已有文件路径列表
+    """
+    st = os.stat(file_path)
+
+    def digest(path, path_stat, field, hash_func):
+        cached = catalog.get(path, path_stat)
+        if cached is not None and cached[field]:
+            return cached[field]
+        value, _ = hash_func(path, path_stat.st_size)
+        catalog.update(path, path_stat, **{field: value})
+        return value
+
+    duplicates = []
+    for other in catalog.paths_with_size(st.st_size):
+        if other == file_path:
+            continue
+        try:
+            other_stat = os.stat(other)
+        except FileNotFoundError:
+            catalog.remove(other)
+            continue
+        if other_stat.st_size != st.st_size:
+            continue
+        try:
+            if digest(other, other_stat, 'partial_hash', _partial_hash) != \
+                    digest(file_path, st, 'partial_hash', _partial_hash):
+                continue
+            if st.st_size > 2 * PARTIAL_HASH_SIZE and digest(other, other_stat, 'content_hash', _full_hash) != \
+                    digest(file_path, st, 'content_hash', _full_hash):
+                continue
+        except OSError as e:
+            print(f"无法读取文件 {other}: {e}")
+            continue
+        duplicates.append(other)
+    if catalog.get(file_path, st) is None:
+        # 记录新文件的大小，之后上传的文件可以和它比较
+        catalog.update(file_path, st)
+    return duplicates
+
+
+@metrics.timed('image_decode')
+def _load_gray(file_path):
+    """
+    以较低分辨率解码图像，返回 dHash 和 pHash 需要的灰度小图。
+
+    JPEG 使用 draft 模式，解码时直接按 1/2~1/8 缩小，不需要解码全尺寸像素。
+
+    :return: (9x8 灰度数组, 32x32 灰度数组)
+    """
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(file_path) as img:
+        img.draft('L', (PHASH_SIZE * 4, PHASH_SIZE * 4))
+        gray = img.convert('L')
+        small = np.asarray(gray.resize((DHASH_SIZE + 1, DHASH_SIZE), Image.BILINEAR), dtype=np.float32)
+        large = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.BILINEAR), dtype=np.float32)
+    return small, large
+
+
+def _pack_bits(bits):
+    """把 (n, 8, 8) 的布尔数组按行打包为 n 个 64 位整数"""
+    import numpy as np
+
+    packed = np.packbits(bits.reshape(len(bits), -1), axis=1)
+    return [int.from_bytes(row.tobytes(), 'big') for row in packed]
+
+
+@metrics.timed('image_hash')
+def perceptual_hashes(small, large):
+    """
+    批量计算 dHash 和 pHash。
+
+    :param small: (n, 8, 9) 灰度数组
+    :param large: (n, 32, 32) 灰度数组
+    :return: (dHash 列表, pHash 列表)，每个哈希为 64 位整数
+    """
+    import numpy as np
+
+    # dHash：相邻像素的亮度差
+    dhashes = _pack_bits(small[:, :, 1:] > small[:, :, :-1])
+    # pHash：二维 DCT 的低频 8x8 分量与中位数比较（不含直流分量）
+    n = PHASH_SIZE
+    k = np.arange(n)
+    dct = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)).astype(np.float32)
+    coefficients = np.einsum('ij,bjk,lk->bil', dct, large, dct)[:, :DHASH_SIZE, :DHASH_SIZE]
+    flat = coefficients.reshape(len(coefficients), -1)
+    median = np.median(flat[:, 1:], axis=1)
+    phashes = _pack_bits((flat > median[:, None]).reshape(-1, DHASH_SIZE, DHASH_SIZE))
+    return dhashes, phashes
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _popcount(values):
+    """:return: 每个 uint64 元素中 1 的位数"""
+    import numpy as np
+
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    # NumPy 2.0 之前没有 bitwise_count，按字节查表
+    table = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8)].reshape(*values.shape, 8).sum(axis=-1)
+
+
+def hash_chunk_widths(radius):
+    """
+    多索引哈希表的分段：把 64 位哈希分成 radius + 1 段。
+
+    汉明距离不超过 radius 的两个哈希最多有 radius 段不同，至少有一段完全相同（抽屉原理），
+    因此只需要比较至少一段相同的哈希。
+
+    :return: 各段的位数列表，例如 radius=6 时为 [10, 9, 9, 9, 9, 9, 9]
+    """
+    count = min(radius + 1, 64)
+    return [64 // count + (1 if index < 64 % count else 0) for index in range(count)]
+
+
+def near_hash_pairs(first, second, radius):
+    """
+    用多索引哈希表找出两个哈希都相近的所有下标对。
+
+    按 first 的每一段分桶，只在同一个桶内用 NumPy 批量计算汉明距离；
+    一对哈希只在它们第一段相同的分段中输出，所以每对只出现一次。
+
+    :param first: uint64 数组，用于分桶的哈希（dHash）
+    :param second: 与 first 等长的 uint64 数组（pHash），也要求距离不超过 radius
+    :param radius: 允许的最大汉明距离
+    :return: (i, j) 两个下标数组，i < j
+    """
+    import numpy as np
+
+    n = len(first)
+    widths = hash_chunk_widths(radius)
+    keys = np.empty((n, len(widths)), dtype=np.uint64)
+    shift = 64
+    for chunk, width in enumerate(widths):
+        shift -= width
+        keys[:, chunk] = (first >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+
+    found_i, found_j = [], []
+    for chunk in range(len(widths)):
+        order = np.argsort(keys[:, chunk], kind='stable')
+        bounds = np.flatnonzero(np.diff(keys[order, chunk])) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [n]))
+        for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+            members = order[start:end]
+            later = np.arange(len(members))
+            # 按行分块，限制每次比较的矩阵大小
+            rows = max(1, NEAR_PAIR_BLOCK // len(members))
+            for row in range(0, len(members) - 1, rows):
+                left = members[row:row + rows]
+                mask = _popcount(first[left, None] ^ first[None, members]) <= radius
+                mask &= later[None, :] > later[row:row + rows, None]
+                i, j = np.nonzero(mask)
+                # 候选很少，其余条件只对候选计算
+                i, j = left[i], members[j]
+                keep = _popcount(second[i] ^ second[j]) <= radius
+                if chunk:
+                    # 前面某一段已经相同的对在那一段中输出过了
+                    keep &= ~(keys[i, :chunk] == keys[j, :chunk]).any(axis=1)
+                found_i.append(i[keep])
+                found_j.append(j[keep])
+    if not found_i:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(found_i), np.concatenate(found_j)
+
+
+def image_hashes(paths, workers=HASH_WORKERS, catalog=None):
+    """
+    计算图像的 dHash 和 pHash，解码在线程池中进行，哈希按批用 NumPy 计算。
+
+    :param paths: 图像路径列表
+    :param workers: 解码图像的线程数
+    :param catalog: 可选的 catalog.Catalog，未变化的文件直接使用缓存的哈希
+    :return: 字典，键为路径，值为 (dHash, pHash)
+    """
+    import numpy as np
+
+    hashes = {}
+    pending = []
+    for path in paths:
+        if catalog is not None:
+            cached = catalog.get(path)
+            if cached is not None and cached['image_hash']:
+                dhash, phash = cached['image_hash'].split(':')
+                hashes[path] = (int(dhash, 16), int(phash, 16))
+                continue
+        pending.append(path)
+
+    def load(path):
+        try:
+            return path, _load_gray(path)
+        except Exception as e:
+            print(f"无法读取图像 {path}: {e}")
+            return path, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(pending), IMAGE_HASH_BATCH):
+            loaded = [(path, arrays) for path, arrays in executor.map(load, pending[start:start + IMAGE_HASH_BATCH])
+                      if arrays is not None]
+            if not loaded:
+                continue
+            small = np.stack([arrays[0] for _, arrays in loaded])
+            large = np.stack([arrays[1] for _, arrays in loaded])
+            for (path, _), dhash, phash in zip(loaded, *perceptual_hashes(small, large)):
+                hashes[path] = (dhash, phash)
+                if catalog is not None:
+                    catalog.update(path, image_hash=f"{dhash:016x}:{phash:016x}")
+    if catalog is not None:
+        catalog.commit()
+    return hashes
+
+
+def find_near_duplicates(directory, radius=NEAR_DUPLICATE_RADIUS, workers=HASH_WORKERS, catalog=None):
+    """
+    找到内容相近的图片（不同尺寸、不同压缩质量、PNG 转换为 JPEG 等）。
+
+    完全相同的哈希先合并，其余的用多索引哈希表（near_hash_pairs）查找 dHash 和 pHash 都在 radius 以内的图片。
+
+    :param directory: 要扫描的目录路径
+    :param radius: 允许的最大汉明距离（64 位哈希）
+    :param workers: 解码图像的线程数
+    :param catalog: 可选的 catalog.Catalog
+    :return: 列表，每项为一组相近图片的路径列表
+    """
+    import numpy as np
+
+    paths = sorted(entry.path for entry in scan(directory, NEAR_DUPLICATE_EXTENSIONS))
+    hashes = image_hashes(paths, workers, catalog)
+
+    paths = list(hashes)
+    if not paths:
+        return []
+    values = np.array([hashes[path] for path in paths], dtype=np.uint64)
+    unique, inverse = np.unique(values, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    # 每个不同的哈希取第一张图片作为代表
+    representatives = [None] * len(unique)
+    for path, index in zip(paths, inverse.tolist()):
+        if representatives[index] is None:
+            representatives[index] = path
+
+    # 并查集，把两两相近的图片合并为一组
+    parent = {}
+
+    def find(path):
+        parent.setdefault(path, path)
+        while parent[path] != path:
+            parent[path] = parent[parent[path]]
+            path = parent[path]
+        return path
+
+    for path, index in zip(paths, inverse.tolist()):
+        if path != representatives[index]:
+            parent[find(path)] = find(representatives[index])
+    for i, j in zip(*(indexes.tolist() for indexes in near_hash_pairs(unique[:, 0], unique[:, 1], radius))):
+        parent[find(representatives[j])] = find(representatives[i])
+
+    groups = defaultdict(list)
+    for path in parent:
+        groups[find(path)].append(path)
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1)
+
+
+def signature_times(duration):
+    """
+    :return: 视频指纹的采样时间点（秒）：跳过首尾各 5%，在中间均匀分布 VIDEO_SIGNATURE_FRAMES 个
+    """
+    step = duration * 0.9 / VIDEO_SIGNATURE_FRAMES
+    return [round(duration * 0.05 + step * (index + 0.5), 3) for index in range(VIDEO_SIGNATURE_FRAMES)]
+
+
+@metrics.timed('video_signature')
+def video_signature(video_path, catalog=None):
+    """
+    计算视频指纹：在 signature_times 的每个时间点精确定位取一帧（一次 ffmpeg 调用），
+    每帧缩小为 9x8 后计算 dHash。采样不依赖关键帧间隔，重新编码后取到的仍是相同时间的画面。
+
+    :param video_path: 视频文件路径
+    :param catalog: 可选的 catalog.Catalog，用于缓存指纹和 ffprobe 结果
+    :return: (时长（秒）, ((采样时间, dHash), ...))
+    """
+    import numpy as np
+
+    if catalog is not None:
+        cached = catalog.get(video_path)
+        # 旧版本缓存的指纹不带采样时间，需要重新计算
+        if cached is not None and cached['video_signature'] and ':' in cached['video_signature']:
+            duration, samples = cached['video_signature'].split('|')
+            return float(duration), tuple((float(time), int(h, 16))
+                                          for time, h in (sample.split(':') for sample in samples.split(',') if sample))
+    duration = video_duration(probe_video(video_path, catalog)) or 0.0
+    times = signature_times(duration) if duration > 0 else []
+    frames = read_frames_at(video_path, times, DHASH_SIZE + 1, DHASH_SIZE) if times else []
+    if len(frames) == len(times):
+        sampled = list(zip(times, frames))
+    else:
+        # 某个时间点没有取到帧时无法对应，改为逐个时间点读取
+        sampled = []
+        for time in times:
+            frame = read_frames_at(video_path, [time], DHASH_SIZE + 1, DHASH_SIZE)
+            if len(frame):
+                sampled.append((time, frame[0]))
+    samples = ()
+    if sampled:
+        luma = np.stack([frame for _, frame in sampled]).astype(np.float32) \
+            @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        samples = tuple(zip((time for time, _ in sampled), _pack_bits(luma[:, :, 1:] > luma[:, :, :-1])))
+    if catalog is not None:
+        catalog.update(video_path, video_signature=f"{duration}|{','.join(f'{t}:{h:016x}' for t, h in samples)}")
+    return duration, samples
+
+
+def signature_distance(a, b):
+    """
+    按采样时间配对比较两个视频指纹（时间相差不超过 VIDEO_DURATION_BUCKET 秒的帧视为同一位置）。
+
+    :param a: video_signature 返回的 ((采样时间, dHash), ...)
+    :param b: 同上
+    :return: 配对帧汉明距离的平均值；没有可配对的帧时返回最大距离
+    """
+    distances = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        (time, h), (other_time, other_h) = a[i], b[j]
+        if abs(time - other_time) <= VIDEO_DURATION_BUCKET:
+            distances.append(hamming_distance(h, other_h))
+            i += 1
+            j += 1
+        elif time < other_time:
+            i += 1
+        else:
+            j += 1
+    if not distances:
+        return DHASH_SIZE * DHASH_SIZE
+    return sum(distances) / len(distances)
+
+
+def find_video_near_duplicates(directory, max_distance=VIDEO_DUPLICATE_DISTANCE, workers=VIDEO_SIGNATURE_WORKERS,
+                               catalog=None):
+    """
+    找到重新编码过的重复视频（大小不同，但内容相同）。
+
+    先按时长分桶，只比较时长相近的视频的指纹。
+
+    :param directory: 要扫描的目录路径
+    :param max_distance: 指纹逐帧平均汉明距离不超过该值时视为重复
+    :param workers: 同时运行的 ffmpeg 进程数
+    :param catalog: 可选的 catalog.Catalog
+    :return: 列表，每项为一组重复视频的路径列表
+    """
+    paths = sorted(entry.path for entry in scan(directory, VIDEO_EXTENSIONS))
+
+    def run(path):
+        try:
+            return path, video_signature(path, catalog)
+        except Exception as e:
+            print(f"无法计算视频指纹 {path}: {e}")
+            return path, None
+
+    buckets = defaultdict(list)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for path, signature in executor.map(run, paths):
+            if signature is not None and signature[1]:
+                buckets[round(signature[0] / VIDEO_DURATION_BUCKET)].append((path, signature))
+    if catalog is not None:
+        catalog.commit()
+
+    parent = {}
+
+    def find(path):
+        parent.setdefault(path, path)
+        while parent[path] != path:
+            parent[path] = parent[parent[path]]
+            path = parent[path]
+        return path
+
+    for bucket, videos in buckets.items():
+        # 时长可能落在相邻的桶中
+        candidates = videos + buckets.get(bucket + 1, [])
+        for i, (path, (duration, hashes)) in enumerate(videos):
+            for other, (other_duration, other_hashes) in candidates[i + 1:]:
+                if abs(duration - other_duration) > VIDEO_DURATION_BUCKET:
+                    continue
+                if signature_distance(hashes, other_hashes) <= max_distance:
+                    parent[find(other)] = find(path)
+
+    groups = defaultdict(list)
+    for path in parent:
+        groups[find(path)].append(path)
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1)
 
 
 def main():
-    directory =r"\\qunhui\home\Photos"
-    preferred_dir = r"\\qunhui\home\Photos\未分类"
+    parser = argparse.ArgumentParser(description="Find and delete duplicate files larger than 10MB")
+    parser.add_argument('directory', nargs='?', default=r"\\qunhui\home\Photos")
+    parser.add_argument('preferred_dir', nargs='?', default=r"\\qunhui\home\Photos\未分类")
+    add_plan_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_metrics(args)
+    directory = args.directory
+    preferred_dir = args.preferred_dir
+
+    if args.apply:
+        with Catalog() as catalog:
+            apply_plan(args.apply, catalog=catalog, clean_temp=args.clean_temp)
+        report_metrics(args)
+        return
 
     if not os.path.isdir(directory):
         print("无效的扫描目录路径！")
@@ -59,14 +678,20 @@ def main():
         print("无效的优先删除目录路径！")
         return
 
-    duplicates = find_duplicates_by_size(directory)
+    stats = {}
+    with Catalog() as catalog:
+        duplicates = find_duplicates_by_size(directory, stats=stats, catalog=catalog)
+    print_stats(stats)
 
     if not duplicates:
-        print("没有找到超过 10MB 且大小相同的重复文件。")
+        print("没有找到超过 10MB 且内容相同的重复文件。")
+    elif args.plan:
+        write_plan(args.plan, 'photo_duplicate', plan_delete_duplicates(duplicates, preferred_dir))
     else:
         print("发现重复文件，开始删除...")
         delete_duplicates(duplicates, preferred_dir)
         print("删除完成！")
+    report_metrics(args)
 
 
 if __name__ == "__main__":
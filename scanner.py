@@ -0,0 +1,119 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# 同时列目录的线程数；NAS 上每次列目录都有网络往返，并发可以把延迟叠在一起
+SCAN_WORKERS = 8
+# 默认跳过的目录（群晖自动生成的缩略图目录）
+SKIP_DIRS = ('@eaDir',)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+VIDEO_EXTENSIONS = ('.mp4', '.mkv')
+MEDIA_EXTENSIONS = IMAGE_EXTENSIONS + VIDEO_EXTENSIONS
+
+
+def _list_directory(directory, extensions, skip_dirs, prefetch_stat):
+    """列出一个目录，返回 (文件列表, 子目录路径列表)"""
+    files = []
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in skip_dirs:
+                            subdirectories.append(entry.path)
+                    elif extensions is None or entry.name.lower().endswith(extensions):
+                        if prefetch_stat:
+                            # DirEntry 会缓存 stat 结果，在工作线程中预先获取
+                            entry.stat(follow_symlinks=False)
+                        files.append(entry)
+                except OSError as e:
+                    print(f"无法处理文件 {entry.path}: {e}")
+    except OSError as e:
+        print(f"无法读取目录 {directory}: {e}")
+    return files, subdirectories
+
+
+def entry_stat(entry):
+    """
+    获取 DirEntry 的 stat 结果，用于与 os.stat 写入的 catalog 键 (size, mtime_ns, inode) 比较。
+
+    Windows 上 DirEntry.stat() 的 st_ino 和 st_dev 总是 0，此时改用 os.stat 获取真实的值。
+
+    :param entry: os.DirEntry
+    :return: os.stat_result
+    """
+    st = entry.stat(follow_symlinks=False)
+    if st.st_ino == 0:
+        st = os.stat(entry.path, follow_symlinks=False)
+    return st
+
+
+def scan(root, extensions=None, skip_dirs=SKIP_DIRS, workers=SCAN_WORKERS, recursive=True, prefetch_stat=False):
+    """
+    遍历目录，逐个返回文件的 os.DirEntry。子目录由线程池并发列出，返回顺序不固定。
+
+    :param root: 要遍历的目录
+    :param extensions: 只返回这些扩展名（小写，例如 ('.jpg', '.png')）的文件，None 表示全部
+    :param skip_dirs: 跳过这些名字的目录
+    :param workers: 同时列目录的线程数，1 表示在当前线程中逐个列出
+    :param recursive: 为 False 时只列出 root 本身
+    :param prefetch_stat: 在工作线程中预先获取 stat，之后调用 entry.stat() 不再访问磁盘
+    :return: os.DirEntry 的生成器
+    """
+    if isinstance(extensions, str):
+        extensions = (extensions,)
+    if extensions is not None:
+        extensions = tuple(extension.lower() for extension in extensions)
+    skip_dirs = tuple(skip_dirs or ())
+
+    if workers <= 1:
+        pending = [root]
+        while pending:
+            files, subdirectories = _list_directory(pending.pop(), extensions, skip_dirs, prefetch_stat)
+            yield from files
+            if recursive:
+                pending.extend(reversed(subdirectories))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {executor.submit(_list_directory, root, extensions, skip_dirs, prefetch_stat)}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirectories = future.result()
+                if recursive:
+                    for subdirectory in subdirectories:
+                        running.add(executor.submit(_list_directory, subdirectory, extensions, skip_dirs,
+                                                    prefetch_stat))
+                yield from files
+
+
+def find_directories(root, match, skip_dirs=SKIP_DIRS, workers=SCAN_WORKERS):
+    """
+    遍历目录树，逐个返回名字满足 match 的目录路径，匹配的目录不再向下遍历。子目录由线程池并发列出，返回顺序不固定。
+
+    :param root: 要遍历的目录，本身满足 match 时直接返回 root
+    :param match: 判断函数 match(目录名)
+    :param skip_dirs: 跳过这些名字的目录
+    :param workers: 同时列目录的线程数，1 表示在当前线程中逐个列出
+    :return: 目录路径的生成器
+    """
+    if match(os.path.basename(os.path.normpath(root))):
+        yield root
+        return
+    skip_dirs = tuple(skip_dirs or ())
+
+    def list_subdirectories(directory):
+        # 扩展名为空元组时不收集任何文件
+        return _list_directory(directory, (), skip_dirs, False)[1]
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        running = {executor.submit(list_subdirectories, root)}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                for subdirectory in future.result():
+                    if match(os.path.basename(subdirectory)):
+                        yield subdirectory
+                    else:
+                        running.add(executor.submit(list_subdirectories, subdirectory))
@@ -1,6 +1,29 @@
+import argparse
 import os
 import re
 import shutil
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from journal import add_arguments as add_plan_arguments, apply_delete, apply_plan, apply_rename, write_plan
+from scanner import SCAN_WORKERS, find_directories, scan
+
+# Number of season directories processed at once in library mode
+SEASON_WORKERS = 4
+# Season directory names recognized in library mode (S01, S2, ...)
+SEASON_DIR_PATTERN = re.compile(r"^S\d+$")
+SUBTITLE_EXTENSIONS = ('.srt', '.ass')
+
+# Patterns used by parse_file_name that do not depend on the season
+DOTTED_EPISODE_PATTERN = re.compile(r"\.(E\d+)\.")
+CHINESE_EPISODE_PATTERN = re.compile(r"第(\d+)集")
+CHINESE_TITLE_PATTERNS = (
+    re.compile(r"第\d+集 (.+?)-"),
+    re.compile(r"第\d+集 (.+?)_"),
+    re.compile(r"第\d+集 (.+?)\."),
+)
+NUMBERED_TITLE_PATTERN = re.compile(r"^(\d+) (.+?)$")
 
 
 def delete_dir(dir_path, dir_name):
@@ -15,36 +38,35 @@ def delete_dir(dir_path, dir_name):
 
 episode_number_def = 0
 
+@lru_cache(maxsize=None)
+def season_episode_pattern(season):
+    """Compile the SxxEyy pattern once per season"""
+    return re.compile(rf"({season}E\d+)")
+
+
 def parse_file_name(file_name, season):
     # Rename the MP4 file according to Jellyfin rules
     # 安全警长啦咘啦哆.An.Quan.Jing.Zhang.La.Bu.La.Duo.S01E01.2022.2160p.HQ.WEB-DL.AAC.H265-HDSWEB.mp4
-    match = re.search(rf"({season}E\d+)", file_name)
+    match = season_episode_pattern(season).search(file_name)
     if match:
         return match.group(1)
     # Gourd.Brothers.1986.E01.Webrip.1080p.x265.10bit.AAC.MNHD-FRDS
-    match = re.search(r"\.(E\d+)\.", file_name)
+    match = DOTTED_EPISODE_PATTERN.search(file_name)
     if match:
         return f"{season}{match.group(1)}"
     # 超级飞侠 第09集 迷路的小羚羊-超高清 4K.mp4
-    match = re.search(r"第(\d+)集", file_name)
+    match = CHINESE_EPISODE_PATTERN.search(file_name)
     if match:
         episode_number = f"{season}E{match.group(1)}"
-        title_match = re.search(r"第\d+集 (.+?)-", file_name)
-        if title_match:
-            episode_title = title_match.group(1)
-            return f"{episode_number} {episode_title}"
-        title_match = re.search(r"第\d+集 (.+?)_", file_name)
-        if title_match:
-            episode_title = title_match.group(1)
-            return f"{episode_number} {episode_title}"
-        title_match = re.search(r"第\d+集 (.+?)\.", file_name)
-        if title_match:
-            episode_title = title_match.group(1)
-            return f"{episode_number} {episode_title}"
+        for title_pattern in CHINESE_TITLE_PATTERNS:
+            title_match = title_pattern.search(file_name)
+            if title_match:
+                episode_title = title_match.group(1)
+                return f"{episode_number} {episode_title}"
         return episode_number
     # 3 蒙古国恐龙之旅（上）4K.mp4
     # 1 巴西的消防演习 4K.mp4
-    match = re.search(r"^(\d+) (.+?)$", file_name)
+    match = NUMBERED_TITLE_PATTERN.search(file_name)
     if match:
         episode_number = f"{season}E{match.group(1)}"
         episode_title = match.group(2).replace("_4K","").replace("4K","").strip()
@@ -65,46 +87,133 @@ def parse_file_name(file_name, season):
     return None
 
 
-def rename_mp4_files(dir_path):
-    subtitle_extensions = ['.srt', '.ass']
+def prefixed_names(sorted_names, prefix):
+    """
+    Find names starting with prefix by binary search; they form one contiguous run in a sorted list.
+
+    :param sorted_names: file names sorted with sorted()
+    :param prefix: name prefix
+    :return: generator of matching names, in sorted order
+    """
+    index = bisect_left(sorted_names, prefix)
+    while index < len(sorted_names) and sorted_names[index].startswith(prefix):
+        yield sorted_names[index]
+        index += 1
+
+
+def plan_rename_mp4_files(dir_path):
+    """
+    Plan phase: work out which files rename_mp4_files would delete and rename, without touching them.
+
+    :param dir_path: season directory
+    :return: list of {'op': 'delete', 'path'} and {'op': 'rename', 'path', 'target'} operations
+    """
     # last directory is the season directory
     season = os.path.basename(dir_path)
-    for root, dirs, files in os.walk(dir_path):
-        files = sorted(files)  # Sort files by name
-        for file in files:
-            file_path = os.path.join(root, file)
-            if file.lower().endswith('.nfo'):
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    print(f"Deleted: {file_path}")
-                else:
-                    print(f"File not found: {file_path}")
-                continue
-            if file.lower().endswith(f'.mp4') or file.lower().endswith(f'.mkv'):
-                base_name = os.path.splitext(file)[0]
-                file_format = os.path.splitext(file)[1]
-                mp4_path = os.path.join(root, file)
-
-                # Rename the MP4 file according to Jellyfin rules
-                # 安全警长啦咘啦哆.An.Quan.Jing.Zhang.La.Bu.La.Duo.S01E01.2022.2160p.HQ.WEB-DL.AAC.H265-HDSWEB.mp4
-                match = parse_file_name(base_name, season)
-                if match:
-                    # Delete files with the same base name but different extensions
-                    for other_file in files:
-                        other_ext = os.path.splitext(other_file)[1].lower()
-                        if other_file != file and os.path.splitext(other_file)[0].startswith(
-                                base_name) and other_ext not in subtitle_extensions:
-                            os.remove(os.path.join(root, other_file))
-                            print(f"Deleted: {os.path.join(root, other_file)}")
-
-                    new_name = f"{match}{file_format}"
-                    new_path = os.path.join(root, new_name)
-                    os.rename(mp4_path, new_path)
-                    print(f"Renamed: {mp4_path} to {new_path}")
-                else:
-                    print(f"Skipped: {mp4_path}")
-        break
+    # Sort files by name
+    files = sorted(entry.name for entry in scan(dir_path, skip_dirs=(), workers=1, recursive=False))
+    operations = []
+    # files already deleted or renamed by an earlier operation
+    gone = set()
+    for file in files:
+        if file in gone:
+            continue
+        file_path = os.path.join(dir_path, file)
+        if file.lower().endswith('.nfo'):
+            operations.append({'op': 'delete', 'path': file_path})
+            gone.add(file)
+            continue
+        if file.lower().endswith(f'.mp4') or file.lower().endswith(f'.mkv'):
+            base_name = os.path.splitext(file)[0]
+            file_format = os.path.splitext(file)[1]
+            mp4_path = os.path.join(dir_path, file)
+
+            # Rename the MP4 file according to Jellyfin rules
+            # 安全警长啦咘啦哆.An.Quan.Jing.Zhang.La.Bu.La.Duo.S01E01.2022.2160p.HQ.WEB-DL.AAC.H265-HDSWEB.mp4
+            match = parse_file_name(base_name, season)
+            if match:
+                # Delete files with the same base name but different extensions
+                for other_file in prefixed_names(files, base_name):
+                    other_ext = os.path.splitext(other_file)[1].lower()
+                    if other_file != file and other_file not in gone and os.path.splitext(other_file)[0].startswith(
+                            base_name) and other_ext not in SUBTITLE_EXTENSIONS:
+                        operations.append({'op': 'delete', 'path': os.path.join(dir_path, other_file)})
+                        gone.add(other_file)
+
+                new_name = f"{match}{file_format}"
+                new_path = os.path.join(dir_path, new_name)
+                operations.append({'op': 'rename', 'path': mp4_path, 'target': new_path})
+                gone.add(file)
+            else:
+                print(f"Skipped: {mp4_path}")
+    return operations
+
+
+def rename_mp4_files(dir_path):
+    for operation in plan_rename_mp4_files(dir_path):
+        if operation['op'] == 'delete':
+            apply_delete(operation)
+        else:
+            apply_rename(operation)
+
+
+def find_season_directories(root_path, workers=SCAN_WORKERS):
+    """
+    Find every Sxx directory under a series root (or a library of series), without descending into seasons.
+
+    Directories are listed concurrently with scanner.find_directories.
+
+    :param root_path: series root or library root
+    :param workers: number of directories listed at once
+    :return: sorted list of season directory paths
+    """
+    return sorted(find_directories(root_path, SEASON_DIR_PATTERN.match, workers=workers))
+
+
+def plan_rename_library(root_path, workers=SEASON_WORKERS):
+    """
+    Plan every season directory under root_path; seasons are listed and planned in parallel.
+
+    :param root_path: series root or library root
+    :param workers: number of seasons planned at once
+    :return: operations of all seasons, in season order
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        plans = executor.map(plan_rename_mp4_files, find_season_directories(root_path))
+        return [operation for plan in plans for operation in plan]
+
+
+def rename_library(root_path, workers=SEASON_WORKERS):
+    """
+    Run rename_mp4_files for every season directory under root_path, several seasons at a time.
+
+    :param root_path: series root or library root
+    :param workers: number of seasons processed at once
+    :return: number of season directories processed
+    """
+    seasons = find_season_directories(root_path)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(rename_mp4_files, seasons))
+    print(f"Processed {len(seasons)} season directories under {root_path}")
+    return len(seasons)
 
 
 if __name__ == '__main__':
-    rename_mp4_files(r"\\qunhui\usbshare1\剧集\熊出没\S04")
+    parser = argparse.ArgumentParser(description="Rename episodes in a season directory according to Jellyfin rules")
+    parser.add_argument('dir', nargs='?', default=r"\\qunhui\usbshare1\剧集\熊出没\S04")
+    parser.add_argument('--library', action='store_true',
+                        help="Treat dir as a series (or library) root and process every Sxx directory below it")
+    parser.add_argument('--workers', type=int, default=SEASON_WORKERS, help="Seasons processed at once with --library")
+    add_plan_arguments(parser)
+    args = parser.parse_args()
+    if args.plan:
+        if args.library:
+            write_plan(args.plan, 'season_rename', plan_rename_library(args.dir, args.workers))
+        else:
+            write_plan(args.plan, 'season_rename', plan_rename_mp4_files(args.dir))
+    elif args.apply:
+        apply_plan(args.apply, clean_temp=args.clean_temp)
+    elif args.library:
+        rename_library(args.dir, args.workers)
+    else:
+        rename_mp4_files(args.dir)
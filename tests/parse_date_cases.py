@@ -0,0 +1,138 @@
+"""
+parse_date 测试和 benchmark.py 共用的文件名样本，以及改写之前的文件名解析实现。
+"""
+import random
+import re
+import uuid
+from datetime import datetime, timedelta
+
+
+def make_file_names(count=100000, seed=0):
+    """
+    生成 parse_date 能识别（以及不能识别）的各种文件名，结果只与 seed 有关。
+
+    :param count: 文件名数量
+    :param seed: 随机种子
+    :return: 文件名列表
+    """
+    rng = random.Random(seed)
+    start = datetime(2005, 1, 1)
+
+    def moment():
+        # 少量日期在未来，用于覆盖"时间不能超过当前时间"的校验
+        return start + timedelta(seconds=rng.randrange(0, 30 * 365 * 24 * 3600))
+
+    def hex_digits(n):
+        return ''.join(rng.choice('0123456789abcdef') for _ in range(n))
+
+    shapes = [
+        lambda t: f"MYXJ_{t:%Y%m%d%H%M%S}_fast.jpg",
+        lambda t: f"Screenshot_{t:%Y-%m-%d-%H-%M-%S}.jpeg",
+        lambda t: f"Screenshot_{t:%Y-%m-%d-%H-%M-%S}-{rng.randrange(1000):03d}.png",
+        lambda t: f"IMG_{t:%Y%m%d_%H%M%S}.jpg",
+        lambda t: f"VID_{t:%Y%m%d_%H%M%S}.mp4",
+        lambda t: f"{t:%Y-%m-%d-%H%M%S}{rng.randrange(1000):03d}.mp4",
+        lambda t: f"{t:%Y-%m-%d-%H%M%S}.mp4",
+        lambda t: f"照片{t:%Y%m%d %H%M%S}.jpg",
+        lambda t: f"{t:%Y%m%d%H%M%S}.jpg",
+        lambda t: f"{t:%y%m%d%H%M%S}{rng.randrange(10000):04d}.jpg",
+        lambda t: f"{int(t.timestamp() * 1000)}.jpg",
+        lambda t: f"wx_camera_{int(t.timestamp() * 1000)}.jpg",
+        lambda t: f"{int(t.timestamp() * 1000000)}.jpg",
+        lambda t: f"share_{hex_digits(32)}{int(t.timestamp() * 1000)}.jpg",
+        lambda t: f"mmexport{int(t.timestamp() * 1000)}_{uuid.UUID(int=rng.getrandbits(128))}.jpg",
+        lambda t: f"{hex_digits(32)}.jpg",
+        lambda t: f"IMG_{t:%Y%m%d}_{rng.randrange(240000):06d}.jpg",
+        lambda t: f"IMG_{t:%Y}{rng.randrange(1, 20):02d}{rng.randrange(1, 40):02d}_{t:%H%M%S}.jpg",
+        lambda t: f"DSC{rng.randrange(100000):05d}.JPG",
+        lambda t: f"{rng.randrange(10 ** 8)}.png",
+        lambda t: "IMG_EDIT.jpg",
+    ]
+    return [shapes[i % len(shapes)](moment()) for i in range(count)]
+
+
+def legacy_parse_file_name_date(file_name):
+    """
+    parse_date 改为表驱动之前的文件名解析逻辑（冻结的副本，不要修改），用于校验结果一致。
+
+    validate_date 也使用旧的实现，不依赖 photo_date 中带缓存的版本。
+    """
+    def validate_date(date_str, format="%Y%m%d_%H%M%S"):
+        try:
+            # 时间不能超过当前时间
+            return datetime.strptime(date_str, format) <= datetime.now()
+        except ValueError:
+            return False
+
+    def remove_uuid(filename):
+        uuid_with_hyphens = r'[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{12}'
+        uuid_without_hyphens = r'[a-fA-F0-9]{32,}'
+        if re.search(uuid_with_hyphens, filename):
+            return re.sub(uuid_with_hyphens, '', filename)
+        for match in re.finditer(uuid_without_hyphens, filename):
+            uuid = match.group()
+            if len(uuid) == 32:
+                return filename.replace(uuid, '')
+            if len(uuid) >= 42:
+                if re.search(r'^\d{10,}', uuid):
+                    return filename.replace(uuid[-32:], '')
+                if re.search(r'\d{10,}$', uuid):
+                    return filename.replace(uuid[:32], '')
+        return filename
+
+    file_name = remove_uuid(file_name)
+    match = re.search(r'(?<=_)\d{14}(?=_)', file_name)
+    if match:
+        if validate_date(match.group(), "%Y%m%d%H%M%S"):
+            return datetime.strptime(match.group(), "%Y%m%d%H%M%S").strftime("%Y%m%d_%H%M%S")
+    match = re.search(r'\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}-\d{3}', file_name)
+    if match:
+        return datetime.strptime(match.group()[: 19], "%Y-%m-%d-%H-%M-%S").strftime("%Y%m%d_%H%M%S")
+    match = re.search(r'\d{8}_\d{6}', file_name)
+    if match:
+        if validate_date(match.group()):
+            return match.group()
+    match = re.search(r"(\d{4}-\d{2}-\d{2})-(\d{6})(\d{3})", file_name)
+    if match:
+        return datetime.strptime(f"{match.group(1)}-{match.group(2)}", "%Y-%m-%d-%H%M%S").strftime("%Y%m%d_%H%M%S")
+    match = re.search(r'(\d{2})(\d{2})(\d{2})(\d{6})(\d{4})', file_name)
+    if match:
+        year = int(match.group(1)) + 2000
+        if validate_date(f"{year}{match.group(2)}{match.group(3)}_{match.group(4)[:6]}"):
+            return f"{year}{match.group(2)}{match.group(3)}_{match.group(4)[:6]}"
+    match = re.search(r'(\d{8})\s(\d{6})', file_name)
+    if match:
+        if validate_date(f"{match.group(1)}_{match.group(2)}"):
+            return f"{match.group(1)}_{match.group(2)}"
+    match = re.search(r'(\d{8})_(\d{6})', file_name)
+    if match:
+        if validate_date(f"{match.group(1)}_{match.group(2)}"):
+            return f"{match.group(1)}_{match.group(2)}"
+    match = re.search(r'20\d{12}(?=\.jpg)', file_name)
+    if match:
+        if validate_date(f"{match.group()[:8]}_{match.group()[8:14]}"):
+            return f"{match.group()[:8]}_{match.group()[8:14]}"
+    match = re.search(r'(\d{4}-\d{2}-\d{2})-(\d{6})', file_name)
+    if match:
+        shooting_time = f"{match.group(1)}_{match.group(2)}".replace('-', '')
+        if validate_date(shooting_time):
+            return shooting_time
+    match = re.search(r'(\d{4}-\d{2}-\d{2})-(\d{2}-\d{2}-\d{2})', file_name)
+    if match:
+        shooting_time = f"{match.group(1)}_{match.group(2)}".replace('-', '')
+        if validate_date(shooting_time):
+            return shooting_time
+    match = max(re.findall(r'\d+', file_name), key=len)
+    if len(match) == 16 or len(match) == 13:
+        shooting_time = datetime.fromtimestamp(int(match) / 1000).strftime("%Y%m%d_%H%M%S")
+        if validate_date(shooting_time):
+            return shooting_time
+    return None
+
+
+def legacy(name):
+    """legacy_parse_file_name_date，无法解析时抛出的异常按"没有日期"处理，与调用方的行为相同"""
+    try:
+        return legacy_parse_file_name_date(name)
+    except (ValueError, OverflowError, OSError):
+        return None
@@ -0,0 +1,43 @@
+"""
+第二次运行 set_photo_date_all 时，catalog 中已处理且未变化的文件必须全部跳过。
+
+Windows 上 DirEntry.stat() 的 st_ino 总是 0，而 catalog 用 os.stat 写入真实的 inode，
+这里用 st_ino 为 0 的 DirEntry 模拟这种情况。
+"""
+from types import SimpleNamespace
+
+from PIL import Image
+
+import photo_date
+import scanner
+from catalog import Catalog
+
+
+class ZeroInodeEntry:
+    """包装 os.DirEntry，stat() 与 Windows 上一样返回 st_ino = st_dev = 0"""
+
+    def __init__(self, entry):
+        self._entry = entry
+        self.path = entry.path
+        self.name = entry.name
+
+    def stat(self, follow_symlinks=True):
+        st = self._entry.stat(follow_symlinks=follow_symlinks)
+        return SimpleNamespace(st_size=st.st_size, st_mtime_ns=st.st_mtime_ns, st_ino=0, st_dev=0)
+
+
+def test_second_run_skips_every_file(tmp_path, monkeypatch):
+    photos = tmp_path / 'photos'
+    photos.mkdir()
+    Image.new('RGB', (32, 24), 'red').save(photos / 'IMG_20200101_101010.jpg')
+    Image.new('RGB', (32, 24), 'blue').save(photos / 'holiday.jpg')
+    (photos / 'notes.txt').write_text('no date here')
+    monkeypatch.setattr(photo_date, 'scan', lambda *args, **kwargs: (
+        ZeroInodeEntry(entry) for entry in scanner.scan(*args, **kwargs)))
+
+    with Catalog(str(tmp_path / 'catalog.sqlite3')) as catalog:
+        first = photo_date.set_photo_date_all(str(photos), catalog)
+        second = photo_date.set_photo_date_all(str(photos), catalog)
+
+    assert first['processed'] == 3
+    assert second == {'processed': 0, 'skipped': 3, 'errors': 0}
@@ -0,0 +1,43 @@
+"""
+parse_file_name_date / parse_file_name_dates 必须与表驱动改写之前的实现结果完全一致，并且更快。
+"""
+import time
+
+import pytest
+
+import photo_date
+from parse_date_cases import legacy, make_file_names
+
+# 每种文件名形状都会出现上千次
+NAME_COUNT = 20000
+# 速度比较使用与 benchmark.py 相同的样本数
+BENCHMARK_NAME_COUNT = 100000
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_matches_legacy_parser(seed):
+    names = make_file_names(NAME_COUNT, seed)
+    photo_date.reset_current_time()
+    expected = [legacy(name) for name in names]
+    single = [photo_date.parse_file_name_date(name) for name in names]
+    batch = photo_date.parse_file_name_dates(names)
+
+    mismatches = [(name, e, a, b) for name, e, a, b in zip(names, expected, single, batch) if not e == a == b]
+    assert not mismatches, mismatches[:10]
+    # 生成的文件名大部分都带有可以解析的日期，避免两边都返回 None 时测试失去意义
+    assert sum(1 for e in expected if e) > NAME_COUNT // 2
+
+
+def test_batch_faster_than_legacy():
+    names = make_file_names(BENCHMARK_NAME_COUNT)
+
+    start = time.perf_counter()
+    expected = [legacy(name) for name in names]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = photo_date.parse_file_name_dates(names)
+    batch_seconds = time.perf_counter() - start
+
+    assert batch == expected
+    assert batch_seconds < legacy_seconds, f"batch {batch_seconds:.2f}s, legacy {legacy_seconds:.2f}s"
@@ -0,0 +1,134 @@
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from catalog import stat_key
+from metrics import metrics
+
+# 只读取需要的字段，ffprobe 不必输出全部流信息
+PROBE_ENTRIES = ('format=duration:format_tags=creation_time:'
+                 'stream=index,codec_type,width,height:stream_tags=creation_time')
+# 同时运行的 ffprobe 进程数
+PROBE_WORKERS = 8
+# 进程内缓存的最大条目数；watch 这样长时间运行的进程中缓存不能无限增长，更早的结果可以从 catalog 读取
+PROBE_MEMO_SIZE = 1024
+
+# 当前进程内的 LRU 缓存，键为 (path, size, mtime_ns, inode)
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _memo_get(key):
+    with _memo_lock:
+        probe = _memo.get(key)
+        if probe is not None:
+            _memo.move_to_end(key)
+        return probe
+
+
+def _memo_put(key, probe):
+    with _memo_lock:
+        _memo[key] = probe
+        _memo.move_to_end(key)
+        while len(_memo) > PROBE_MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
+@metrics.timed('ffprobe')
+def run_ffprobe(video_path):
+    """
+    调用 ffprobe 读取视频的时长、流类型、分辨率和 creation_time。
+
+    :param video_path: 视频文件路径
+    :return: ffprobe 的 JSON 输出（与 ffmpeg.probe 的结构相同）
+    """
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-show_entries', PROBE_ENTRIES,
+        '-of', 'json',
+        video_path
+    ]
+    result = subprocess.run(command, check=True, capture_output=True)
+    return json.loads(result.stdout)
+
+
+def probe_video(video_path, catalog=None):
+    """
+    读取视频元数据，结果按 (path, size, mtime, inode) 缓存，文件不变时不会重复调用 ffprobe。
+
+    :param video_path: 视频文件路径
+    :param catalog: 可选的 catalog.Catalog，用于跨进程、跨工具持久化缓存
+    :return: ffprobe 的 JSON 输出
+    """
+    st = os.stat(video_path)
+    key = (video_path, *stat_key(st))
+    probe = _memo_get(key)
+    if probe is not None:
+        return probe
+    if catalog is not None:
+        cached = catalog.get(video_path, st)
+        if cached is not None and cached['probe']:
+            probe = json.loads(cached['probe'])
+            _memo_put(key, probe)
+            return probe
+    probe = run_ffprobe(video_path)
+    _memo_put(key, probe)
+    if catalog is not None:
+        catalog.update(video_path, st, probe=json.dumps(probe))
+    return probe
+
+
+def probe_videos(video_paths, catalog=None, workers=PROBE_WORKERS):
+    """
+    并发读取多个视频的元数据。
+
+    :param video_paths: 视频文件路径列表
+    :param catalog: 可选的 catalog.Catalog
+    :param workers: 同时运行的 ffprobe 进程数
+    :return: 字典，键为视频路径，值为 ffprobe 的 JSON 输出，失败的视频值为 None
+    """
+
+    def run(video_path):
+        try:
+            return video_path, probe_video(video_path, catalog)
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            print(f"Failed to probe {video_path}: {e}")
+            return video_path, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = dict(executor.map(run, video_paths))
+    if catalog is not None:
+        catalog.commit()
+    return results
+
+
+def video_duration(probe):
+    """
+    :return: 视频时长（秒），未知时返回 None
+    """
+    duration = probe.get('format', {}).get('duration')
+    return float(duration) if duration else None
+
+
+def video_size(probe):
+    """
+    :return: 第一个视频流的 (宽, 高)，未知时返回 None
+    """
+    for stream in probe.get('streams', []):
+        if stream.get('codec_type') == 'video' and stream.get('width') and stream.get('height'):
+            return stream['width'], stream['height']
+    return None
+
+
+def has_creation_time(probe):
+    """
+    :return: 视频流中是否已经有 creation_time 标签
+    """
+    for stream in probe.get('streams', []):
+        if stream.get('codec_type') == 'video' and 'creation_time' in stream.get('tags', {}):
+            return True
+    return False
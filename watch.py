@@ -0,0 +1,222 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+import traceback
+
+from catalog import Catalog
+from journal import TEMP_PREFIX
+from photo_date import record_photo_date, reset_current_time, set_photo_date
+from photo_duplicate import find_existing_duplicates
+from scanner import SKIP_DIRS, scan
+
+# 文件的大小和修改时间保持不变多少秒后才认为已经写完
+SETTLE_SECONDS = 5
+# 轮询模式下两次扫描的间隔（秒）
+POLL_INTERVAL = 60
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """
+    用 inotify 监听目录树中新建或修改的文件（仅 Linux 本地文件系统；SMB 挂载请使用 PollingWatcher）。
+    """
+
+    def __init__(self, root, skip_dirs=SKIP_DIRS):
+        self.root = root
+        self.skip_dirs = tuple(skip_dirs)
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init()
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        self._directories = {}
+        self._add_tree(root)
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            print(f"无法监听目录 {directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self._directories[wd] = directory
+
+    def _add_tree(self, directory):
+        for root, dirs, _ in os.walk(directory):
+            dirs[:] = [d for d in dirs if d not in self.skip_dirs]
+            self._add_watch(root)
+
+    def events(self, timeout):
+        """
+        等待文件事件。
+
+        :param timeout: 最长等待时间（秒）
+        :return: 有变化的文件路径集合；事件队列溢出时返回 None，调用方需要重新扫描
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        data = os.read(self._fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            directory = self._directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if name not in self.skip_dirs:
+                    # 新目录：监听它，并把已经在里面的文件也当作新文件
+                    self._add_tree(path)
+                    changed.update(entry.path for entry in scan(path, skip_dirs=self.skip_dirs, workers=1))
+            else:
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """定期扫描目录树，比较文件的大小和修改时间，适用于不支持 inotify 的网络挂载"""
+
+    def __init__(self, root, interval=POLL_INTERVAL, skip_dirs=SKIP_DIRS):
+        self.root = root
+        self.interval = interval
+        self.skip_dirs = tuple(skip_dirs)
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self):
+        snapshot = {}
+        for entry in scan(self.root, skip_dirs=self.skip_dirs, prefetch_stat=True):
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            snapshot[entry.path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def events(self, timeout):
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+        self._next_scan = time.monotonic() + self.interval
+        snapshot = self._scan()
+        changed = {path for path, key in snapshot.items() if self._snapshot.get(path) != key}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def process_new_file(file_path, catalog):
+    """
+    处理一个新上传的文件：写入拍摄时间，然后检查是否与已有文件重复。
+
+    :param file_path: 文件路径
+    :param catalog: catalog.Catalog
+    """
+    cached = catalog.get(file_path)
+    if cached is not None and cached['date_state'] is not None:
+        # 已经处理过（例如 set_photo_date 自己写回文件触发的事件）
+        return
+    result = set_photo_date(file_path, catalog)
+    if result is None:
+        return
+    record_photo_date(catalog, file_path, result)
+    new_path = result[0]
+    duplicates = find_existing_duplicates(new_path, catalog)
+    if duplicates:
+        print(f"重复文件: {new_path} 与 {', '.join(duplicates)} 内容相同")
+    catalog.commit()
+
+
+def watch(root, catalog, settle=SETTLE_SECONDS, poll=False, interval=POLL_INTERVAL, handler=process_new_file,
+          max_events=None):
+    """
+    持续监听 root 下新上传或修改的文件，文件写完（settle 秒内没有变化）后交给 handler 处理。
+
+    :param root: 要监听的目录
+    :param catalog: catalog.Catalog
+    :param settle: 文件保持不变多少秒后才处理
+    :param poll: 使用轮询而不是 inotify
+    :param interval: 轮询间隔（秒）
+    :param handler: 处理函数 handler(file_path, catalog)
+    :param max_events: 处理多少个文件后返回，None 表示一直运行
+    """
+    if poll or not sys.platform.startswith('linux'):
+        watcher = PollingWatcher(root, interval)
+    else:
+        try:
+            watcher = InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            print(f"inotify 不可用，改为轮询: {e}")
+            watcher = PollingWatcher(root, interval)
+    print(f"Watching {root} with {type(watcher).__name__}")
+
+    # 正在等待写完的文件: 路径 -> ((大小, 修改时间), 最后一次变化的时间)
+    pending = {}
+    handled = 0
+    try:
+        while max_events is None or handled < max_events:
+            changed = watcher.events(timeout=1)
+            if changed is None:
+                print("事件队列溢出，重新扫描")
+                changed = {entry.path for entry in scan(root)}
+            now = time.monotonic()
+            for path in changed:
+                if not os.path.basename(path).startswith(TEMP_PREFIX):
+                    pending[path] = (None, now)
+            for path, (key, since) in list(pending.items()):
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    del pending[path]
+                    continue
+                current = (st.st_size, st.st_mtime_ns)
+                if current != key:
+                    pending[path] = (current, now)
+                elif now - since >= settle:
+                    del pending[path]
+                    # 长时间运行时刷新"当前时间"，否则新照片的日期会被当作未来时间
+                    reset_current_time()
+                    try:
+                        handler(path, catalog)
+                    except Exception as e:
+                        print("Error processing file:", path, e)
+                        traceback.print_exc()
+                    handled += 1
+    finally:
+        watcher.close()
+        catalog.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tag and de-duplicate new photos as they are uploaded")
+    parser.add_argument('root', nargs='?', default=r'\\qunhui\home\Photos')
+    parser.add_argument('--poll', action='store_true', help="Poll instead of using inotify")
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL)
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS)
+    args = parser.parse_args()
+    with Catalog() as catalog:
+        watch(args.root, catalog, args.settle, args.poll, args.interval)